@@ -642,11 +642,10 @@ def mostra_popup_apertura(pratica_data: dict, id_predefinito: str, on_set_user_l
                         pratica_data.get('refresh_pratica', lambda: None)()
                     except Exception:
                         pass
-                    for k in ('refresh_settori', 'refresh_materie', 'refresh_avvocati'):
-                        try:
-                            pratica_data.get(k, lambda: None)()
-                        except Exception:
-                            pass
+                    try:
+                        pratica_data.get('refresh_all', lambda: None)()
+                    except Exception:
+                        pass
                     ui.notify('Pratica caricata: interfaccia aggiornata', type='positive')
                     try:
                         dialog.close()
@@ -679,11 +678,10 @@ def mostra_popup_apertura(pratica_data: dict, id_predefinito: str, on_set_user_l
                         pratica_data.get('refresh_pratica', lambda: None)()
                     except Exception:
                         pass
-                    for k in ('refresh_settori', 'refresh_materie', 'refresh_avvocati'):
-                        try:
-                            pratica_data.get(k, lambda: None)()
-                        except Exception:
-                            pass
+                    try:
+                        pratica_data.get('refresh_all', lambda: None)()
+                    except Exception:
+                        pass
                     ui.notify('Pratica caricata: interfaccia aggiornata', type='positive')
                     try:
                         dialog.close()
@@ -5,16 +5,23 @@ from contextlib import contextmanager
 from typing import Optional
 
 PRAGMAS = [
+    # page_size ha effetto solo su un DB nuovo, quindi prima del passaggio a WAL
+    ("page_size", "8192"),
     ("foreign_keys", "ON"),
     ("journal_mode", "WAL"),
     ("synchronous", "NORMAL"),
     ("temp_store", "MEMORY"),
+    ("mmap_size", "268435456"),
+    ("cache_size", "-65536"),
+    ("wal_autocheckpoint", "1000"),
 ]
 
 @contextmanager
 def get_connection(db_path: str):
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    con = sqlite3.connect(db_path, isolation_level=None)  # autocommit mode; we'll handle BEGIN manually
+    # autocommit mode; we'll handle BEGIN manually. Cache di statement più ampia:
+    # upsert_pratica/merge_children riusano poche decine di SQL per ogni pratica
+    con = sqlite3.connect(db_path, isolation_level=None, cached_statements=512)
     try:
         for k, v in PRAGMAS:
             try:
@@ -23,10 +30,27 @@ def get_connection(db_path: str):
                 pass
         yield con
     finally:
+        try:
+            # statistiche del planner aggiornate solo dove servono (costo minimo)
+            con.execute("PRAGMA optimize;")
+        except Exception:
+            pass
         con.close()
 
 @contextmanager
 def atomic_tx(con: sqlite3.Connection):
+    if con.in_transaction:
+        # annidata dentro una transazione già aperta (es. import massivo):
+        # savepoint, così un errore annulla solo questa parte
+        con.execute("SAVEPOINT atomic_tx")
+        try:
+            yield con
+        except Exception:
+            con.execute("ROLLBACK TO atomic_tx")
+            con.execute("RELEASE atomic_tx")
+            raise
+        con.execute("RELEASE atomic_tx")
+        return
     try:
         con.execute("BEGIN")
         yield con
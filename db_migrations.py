@@ -10,10 +10,16 @@ CHILD_TABLES = {
     "pratica_avvocati": ["id_pratica","uid","pos","email","nome","ruolo"],
 }
 
+_LEGACY_PRATICA_INDEXES = ("idx_pravv_pratica", "idx_ptar_pratica")
+
 def column_exists(con: sqlite3.Connection, table: str, col: str) -> bool:
     return any(r[1] == col for r in con.execute(f"PRAGMA table_info({table})"))
 
 def ensure_columns(con: sqlite3.Connection) -> None:
+    # hash dello snapshot raw_json (le righe esistenti restano NULL: al primo
+    # upsert vengono riscritte una volta e l'hash viene valorizzato)
+    if not column_exists(con, "pratiche", "raw_hash"):
+        con.execute("ALTER TABLE pratiche ADD COLUMN raw_hash TEXT")
     for t in CHILD_TABLES.keys():
         if not column_exists(con, t, "uid"):
             con.execute(f"ALTER TABLE {t} ADD COLUMN uid TEXT")
@@ -21,8 +27,15 @@ def ensure_columns(con: sqlite3.Connection) -> None:
             con.execute(f"ALTER TABLE {t} ADD COLUMN pos INTEGER")
         # indice (univoco su uid per tabella)
         con.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{t}_uid ON {t}(uid)")
-        # ordina e ricerche veloci
+        # ordina e ricerche veloci: copre sia "WHERE id_pratica=?" sia
+        # "WHERE id_pratica=? ORDER BY pos" (load_pratica, merge_children)
         con.execute(f"CREATE INDEX IF NOT EXISTS idx_{t}_pos ON {t}(id_pratica, pos)")
+        # l'indice del solo id_pratica (vecchi db_schema.sql) è un prefisso di
+        # quello sopra: non serve al planner e costa una scrittura in più per riga
+        con.execute(f"DROP INDEX IF EXISTS idx_{t}_pratica")
+    # stessi indici sul solo id_pratica creati da versioni precedenti di tools/fix_schema.py
+    for legacy in _LEGACY_PRATICA_INDEXES:
+        con.execute(f"DROP INDEX IF EXISTS {legacy}")
     con.commit()
 
 def backfill_uids(con: sqlite3.Connection) -> None:
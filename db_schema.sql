@@ -18,7 +18,8 @@ CREATE TABLE IF NOT EXISTS pratiche (
   note TEXT,
   created_at TEXT DEFAULT (datetime('now')),
   updated_at TEXT,
-  raw_json TEXT   -- snapshot per round-trip UI
+  raw_json TEXT,  -- snapshot per round-trip UI
+  raw_hash TEXT   -- blake2b di raw_json: upsert_pratica salta il master se invariato
 );
 
 CREATE TABLE IF NOT EXISTS pratica_avvocati (
@@ -49,7 +50,6 @@ CREATE TABLE IF NOT EXISTS attivita (
   tipo TEXT,
   note TEXT
 );
-CREATE INDEX IF NOT EXISTS idx_attivita_pratica ON attivita(id_pratica);
 
 CREATE TABLE IF NOT EXISTS scadenze (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -59,7 +59,6 @@ CREATE TABLE IF NOT EXISTS scadenze (
   note TEXT,
   completata INTEGER DEFAULT 0
 );
-CREATE INDEX IF NOT EXISTS idx_scadenze_pratica ON scadenze(id_pratica);
 
 CREATE TABLE IF NOT EXISTS documenti (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -69,7 +68,6 @@ CREATE TABLE IF NOT EXISTS documenti (
   note TEXT,
   hash TEXT
 );
-CREATE INDEX IF NOT EXISTS idx_documenti_pratica ON documenti(id_pratica);
 
 CREATE TABLE IF NOT EXISTS history (
   ts TEXT DEFAULT (datetime('now')),
@@ -12,19 +12,19 @@ Requisiti rispettati:
 from __future__ import annotations
 import sqlite3, datetime, os
 from typing import List, Tuple
-from sql_utils import find_pratica_column, pragma_columns, quote_sql, list_user_tables
+from sql_utils import find_pratica_column, quote_sql, schema_columns
 
 def _connect(db_path: str) -> sqlite3.Connection:
     con = sqlite3.connect(db_path)
     con.row_factory = sqlite3.Row
     return con
 
-def _tables_with_pratica_key(con: sqlite3.Connection) -> list[tuple[str, str]]:
-    pairs: list[tuple[str, str]] = []
-    for t in list_user_tables(con):
-        col = find_pratica_column(con, t)
+def _tables_with_pratica_key(con: sqlite3.Connection) -> list[tuple[str, str, list[str]]]:
+    pairs: list[tuple[str, str, list[str]]] = []
+    for t, cols in schema_columns(con).items():
+        col = find_pratica_column(con, t, cols)
         if col:
-            pairs.append((t, col))
+            pairs.append((t, col, cols))
     return pairs
 
 def export_pratica_sql(db_path: str, idp: str) -> str:
@@ -38,18 +38,18 @@ def export_pratica_sql(db_path: str, idp: str) -> str:
             f"-- Export pratica {idp}",
             f"-- Database: {os.path.abspath(db_path)}",
             f"-- Generato: {datetime.datetime.now().isoformat(timespec='seconds')}",
-            f"-- Tabelle coinvolte: {', '.join(t for t,_ in pairs) if pairs else '(nessuna)'}",
+            f"-- Tabelle coinvolte: {', '.join(t for t, _, _ in pairs) if pairs else '(nessuna)'}",
             "BEGIN;"
         ]
         out: List[str] = header
         total = 0
-        for t, pratica_col in pairs:
-            rows = con.execute(f"SELECT * FROM {t} WHERE {pratica_col}=?", (idp,)).fetchall()
-            cols = pragma_columns(con, t)
+        for t, pratica_col, cols in pairs:
+            # colonne esplicite nell'ordine PRAGMA: valori per posizione, senza r.keys()
+            rows = con.execute(f"SELECT {', '.join(cols)} FROM {t} WHERE {pratica_col}=?", (idp,)).fetchall()
             out.append(f"-- {t}")
             out.append(f"DELETE FROM {t} WHERE {pratica_col}={quote_sql(idp)};")
             for r in rows:
-                vals = [r[c] if (hasattr(r, 'keys') and c in r.keys()) else None for c in cols]
+                vals = tuple(r)
                 out.append(f"INSERT INTO {t} ({', '.join(cols)}) VALUES ({', '.join(quote_sql(v) for v in vals)});")
             total += len(rows)
         out.append("COMMIT;")
@@ -1,11 +1,18 @@
-
 from __future__ import annotations
 from pathlib import Path
 from datetime import datetime
+import atexit
 import json
 import hashlib
 import difflib
-from typing import Any, Dict, Optional
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+log = logging.getLogger("history")
 
 def _sha256_text(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
@@ -13,12 +20,8 @@ def _sha256_text(s: str) -> str:
 def _pretty(obj: Any) -> str:
     return json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=True)
 
-def append_history(folder: Path, actor: str, action: str,
-                   before: Optional[Dict[str, Any]], after: Dict[str, Any]) -> None:
-    """Appende una riga JSON (JSONL) con metadati + diff unified tra stato precedente e successivo."""
-    folder.mkdir(parents=True, exist_ok=True)
-    hist = folder / "history.jsonl"
-    ts = datetime.now().isoformat(timespec="seconds")
+def _history_line(ts: str, actor: str, action: str,
+                  before: Optional[Dict[str, Any]], after: Dict[str, Any]) -> str:
     before_str = _pretty(before) if before is not None else ""
     after_str = _pretty(after)
     diff = "\n".join(difflib.unified_diff(
@@ -33,5 +36,92 @@ def append_history(folder: Path, actor: str, action: str,
         "after_hash": _sha256_text(after_str),
         "diff": diff,
     }
+    return json.dumps(row, ensure_ascii=False) + "\n"
+
+def append_history(folder: Path, actor: str, action: str,
+                   before: Optional[Dict[str, Any]], after: Dict[str, Any]) -> None:
+    """Appende una riga JSON (JSONL) con metadati + diff unified tra stato precedente e successivo."""
+    folder.mkdir(parents=True, exist_ok=True)
+    hist = folder / "history.jsonl"
+    ts = datetime.now().isoformat(timespec="seconds")
     with hist.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        f.write(_history_line(ts, actor, action, before, after))
+
+# ---------------- scrittura differita ----------------
+# I salvataggi accodano l'evento e rilasciano subito il lock della pratica;
+# un thread daemon calcola i diff e scrive a lotti (max _BATCH_MAX eventi o
+# _BATCH_WAIT secondi), con un solo fsync per file history a lotto.
+# Il salvataggio ritorna quindi prima che la riga di history sia su disco:
+# un crash entro _BATCH_WAIT può perdere le ultime righe (pratica.json no).
+# flush_history() (registrata anche in atexit) attende la scrittura.
+
+_BATCH_MAX = 50
+_BATCH_WAIT = 0.2
+
+_Event = Tuple[Path, str, str, str, Optional[Dict[str, Any]], Union[Dict[str, Any], bytes, str]]
+_QUEUE: "queue.Queue[_Event]" = queue.Queue()
+_WORKER: Optional[threading.Thread] = None
+_WORKER_LOCK = threading.Lock()
+
+def _write_batch(batch: List[_Event]) -> None:
+    lines: Dict[Path, List[str]] = {}
+    for folder, ts, actor, action, before, after in batch:
+        try:
+            if isinstance(after, (bytes, str)):
+                after = json.loads(after)
+            lines.setdefault(folder, []).append(_history_line(ts, actor, action, before, after))
+        except Exception:
+            log.exception("history: evento non serializzabile per %s (%s)", folder, action)
+    for folder, rows in lines.items():
+        # la cartella esiste già (il salvataggio l'ha creata): se nel frattempo
+        # la pratica è stata spostata o cancellata non la ricreiamo
+        if not folder.is_dir():
+            log.warning("history: cartella %s non più presente, %d righe scartate", folder, len(rows))
+            continue
+        try:
+            with (folder / "history.jsonl").open("a", encoding="utf-8") as f:
+                f.write("".join(rows))
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            log.exception("history: scrittura fallita in %s, %d righe perse", folder, len(rows))
+
+def _worker() -> None:
+    while True:
+        batch = [_QUEUE.get()]
+        deadline = time.monotonic() + _BATCH_WAIT
+        while len(batch) < _BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            _write_batch(batch)
+        finally:
+            for _ in batch:
+                _QUEUE.task_done()
+
+def enqueue_history(folder: Path, actor: str, action: str,
+                    before: Optional[Dict[str, Any]], after: Union[Dict[str, Any], bytes, str]) -> None:
+    """Come append_history ma asincrona: la riga è su disco solo dopo la
+       scrittura del lotto (vedi flush_history). 'after' può essere il JSON già
+       serializzato (bytes/str): è un'istantanea che il chiamante non può più
+       modificare mentre l'evento è in coda. La cartella non viene creata."""
+    global _WORKER
+    if _WORKER is None or not _WORKER.is_alive():
+        with _WORKER_LOCK:
+            if _WORKER is None or not _WORKER.is_alive():
+                _WORKER = threading.Thread(target=_worker, name="history-writer", daemon=True)
+                _WORKER.start()
+    ts = datetime.now().isoformat(timespec="seconds")
+    _QUEUE.put((Path(folder), ts, actor, action, before, after))
+
+def flush_history() -> None:
+    """Attende che tutti gli eventi in coda siano scritti su disco."""
+    if _WORKER is not None:
+        _QUEUE.join()
+
+atexit.register(flush_history)
@@ -5,27 +5,36 @@ from typing import Optional, Dict, Any, List
 from db_core import get_connection, initialize_schema, atomic_tx
 import repo_sqlite
 
+def _fetch_dicts(con: sqlite3.Connection, sql: str, params: tuple) -> List[Dict[str, Any]]:
+    """Righe come dict senza passare da sqlite3.Row: tuple semplici + nomi
+    colonna letti una volta da cursor.description."""
+    cur = con.cursor()
+    cur.row_factory = None
+    cur.execute(sql, params)
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
 def _fetch_pratica_as_dict(con: sqlite3.Connection, id_pratica: str) -> Optional[Dict[str, Any]]:
     con.row_factory = sqlite3.Row
     row = con.execute("SELECT * FROM pratiche WHERE id_pratica=?", (id_pratica,)).fetchone()
     if not row:
         return None
     out: Dict[str, Any] = dict(row)
-    out["avvocati"] = [dict(r) for r in con.execute(
+    out["avvocati"] = _fetch_dicts(con,
         "SELECT uid,pos,ruolo,email,nome FROM pratica_avvocati WHERE id_pratica=? ORDER BY pos, uid", (id_pratica,)
-    )]
-    out["tariffe"] = [dict(r) for r in con.execute(
+    )
+    out["tariffe"] = _fetch_dicts(con,
         "SELECT uid,pos,tipo_tariffa,valore,note FROM pratica_tariffe WHERE id_pratica=? ORDER BY pos, uid", (id_pratica,)
-    )]
-    out["attivita"] = [dict(r) for r in con.execute(
+    )
+    out["attivita"] = _fetch_dicts(con,
         "SELECT uid,pos,inizio,fine,descrizione,durata_min,tariffa_eur,tipo,note FROM attivita WHERE id_pratica=? ORDER BY pos, uid", (id_pratica,)
-    )]
-    out["scadenze"] = [dict(r) for r in con.execute(
+    )
+    out["scadenze"] = _fetch_dicts(con,
         "SELECT uid,pos,data_scadenza,descrizione,note,completata FROM scadenze WHERE id_pratica=? ORDER BY pos, uid", (id_pratica,)
-    )]
-    out["documenti"] = [dict(r) for r in con.execute(
+    )
+    out["documenti"] = _fetch_dicts(con,
         "SELECT uid,pos,path,categoria,note,hash FROM documenti WHERE id_pratica=? ORDER BY pos, uid", (id_pratica,)
-    )]
+    )
     return out
 
 def export_pratica_sqlite(src_db_path: str, id_pratica: str, out_sqlite_path: str, schema_path: str = "db_schema.sql") -> str:
@@ -9,6 +9,11 @@ from typing import List, Dict, Optional, Callable
 from posizioni_popup_def import mostra_popup_posizioni
 from utils_lookup import load_posizioni
 
+try:
+    import orjson  # opzionale: serializzazione direttamente in bytes
+except Exception:
+    orjson = None  # type: ignore
+
 PG_JSON = Path("lib_json/persone_giuridiche.json")
 
 
@@ -24,11 +29,16 @@ def _carica_persone() -> List[Dict[str, str]]:
             return []
     return []
 
+def _payload_bytes(lista: List[Dict[str, str]]) -> bytes:
+    payload = {"persone_giuridiche": lista}
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_INDENT_2)
+    return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+
 def _salva_persone(lista: List[Dict[str, str]]) -> None:
     PG_JSON.parent.mkdir(parents=True, exist_ok=True)
-    payload = {"persone_giuridiche": lista}
     tmp = PG_JSON.with_suffix(".json.tmp")
-    tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.write_bytes(_payload_bytes(lista))
     os.replace(tmp, PG_JSON)  # atomico su stessa partizione
 
 
@@ -45,22 +55,38 @@ BASE_COLS = [
 ]
 
 def _strip_dict(d: Dict[str, str]) -> Dict[str, str]:
+    """Strip dei valori + colonne base mancanti a "". Se d è già pulito lo restituisce invariato."""
     out: Dict[str, str] = {}
-    for k in d.keys() | set(BASE_COLS):
-        v = d.get(k, "")
-        out[k] = (v.strip() if isinstance(v, str) else v) or ""
-    return out
+    changed = False
+    for k, v in d.items():
+        if isinstance(v, str):
+            s = v.strip()  # str.strip restituisce self se non c'è nulla da togliere
+            if s is not v:
+                changed = True
+        else:
+            s = v or ""
+            changed = changed or s is not v
+        out[k] = s
+    for k in BASE_COLS:
+        if k not in out:
+            out[k] = ""
+            changed = True
+    return out if changed else d
+
+_NOCF_TRANS = str.maketrans("", "", " \t\u00a0")
 
 def _norm_cf(cf: str) -> str:
-    return (cf or "").replace(" ", "").upper()
+    return (cf or "").translate(_NOCF_TRANS).upper()
 
 def _check_duplicate_cf(lista: List[Dict[str, str]], cf: str, *, skip_index: int | None = None) -> bool:
     """True se esiste già un elemento con stesso Cod_fisc (case-insensitive, spazi ignorati)."""
     ncf = _norm_cf(cf)
+    if not ncf:
+        return False
     for i, r in enumerate(lista):
-        if skip_index is not None and i == skip_index:
+        if i == skip_index:
             continue
-        if _norm_cf(r.get("Cod_fisc", "")) == ncf and ncf != "":
+        if _norm_cf(r.get("Cod_fisc", "")) == ncf:
             return True
     return False
 
@@ -137,12 +163,21 @@ def _dialog_form(
                     form_widgets[k] = ui.input(label=k, value=(valori.get(k) if valori else ''))\
                         .props('dense outlined').classes('w-full')
 
+            # chiavi/widget fissati a fine costruzione: _collect scorre due tuple parallele
+            keys_tuple = ('Posizione', *grid_keys)
+            widgets_tuple = tuple(form_widgets[k] for k in keys_tuple)
+
             def _collect() -> Dict[str, str]:
-                raw = {k: getattr(w, 'value', '') or '' for k, w in form_widgets.items()}
-                return _strip_dict(raw)
+                out = {
+                    k: (v.strip() if isinstance(v, str) else (v or ""))
+                    for k, v in zip(keys_tuple, (w.value for w in widgets_tuple))
+                }
+                for k in BASE_COLS:
+                    out.setdefault(k, "")
+                return out
 
             def _reset():
-                for w in form_widgets.values():
+                for w in widgets_tuple:
                     if hasattr(w, 'value'):
                         w.value = ''
                 ui.notify('Campi resettati', type='info')
@@ -160,53 +195,76 @@ def _dialog_form(
 
 # --------------------- Popup principale ---------------------
 
-def mostra_popup_persone_giuridiche(callback_aggiungi: Optional[Callable[[List[Dict[str, str]]], None]] = None):
-    persone = _carica_persone()
-    keys, colonne = _make_columns(persone)
+class _PopupState:
+    """Stato del popup persistente (dialog costruito una sola volta per client)."""
+    def __init__(self):
+        self.dialog = None
+        self.card = None
+        self.table = None
+        self.keys: List[str] = list(BASE_COLS)
+        self.selected_rows: List[Dict[str, str]] = []
+        self.is_full = False
+        self.callback_aggiungi: Optional[Callable[[List[Dict[str, str]]], None]] = None
+
+    def toggle_fullscreen(self):
+        if not self.is_full:
+            self.dialog.props('maximized')
+            self.card.classes(remove='max-w-7xl')
+            self.is_full = True
+        else:
+            self.dialog.props(remove='maximized')
+            self.card.classes(add='max-w-7xl')
+            self.is_full = False
+
+    def refresh_table(self):
+        data = _carica_persone()
+        self.keys, colonne = _make_columns(data)
+        self.table.columns = colonne
+        self.table.rows = _rows_for_table(data)
+        # anche la selezione lato UI, altrimenti resta evidenziata una riga
+        # che Modifica/Elimina non vedono più
+        self.table.selected = []
+        self.table.update()
+        self.selected_rows.clear()
+
+
+# un popup per client (chiave: ui.context.client.id)
+_STATES: Dict[str, _PopupState] = {}
+
+
+def _build_popup(persone: List[Dict[str, str]]) -> _PopupState:
+    st = _PopupState()
+    st.keys, colonne = _make_columns(persone)
 
     dialog = ui.dialog().classes('max-h-[95vh]')
+    st.dialog = dialog
     with dialog:
         card = ui.card().classes('w-full max-w-7xl p-4 bg-white dark:bg-gray-800 rounded-xl shadow-lg')
+        st.card = card
         with card:
             with ui.row().classes('w-full items-center justify-between mb-3 p-2 bg-gray-50 dark:bg-gray-700 rounded-lg'):
                 ui.label('Gestione Persone Giuridiche').classes('text-xl font-bold')
-                is_full = {'v': False}
-                def toggle_fullscreen():
-                    if not is_full['v']:
-                        dialog.props('maximized')
-                        card.classes(remove='max-w-7xl')
-                        is_full['v'] = True
-                    else:
-                        dialog.props(remove='maximized')
-                        card.classes(add='max-w-7xl')
-                        is_full['v'] = False
                 with ui.row().classes('items-center gap-2'):
-                    ui.button('', on_click=toggle_fullscreen, icon='fullscreen').props('flat round').tooltip('Allarga/Riduci')
+                    ui.button('', on_click=st.toggle_fullscreen, icon='fullscreen').props('flat round').tooltip('Allarga/Riduci')
                     ui.button('', on_click=dialog.close, icon='close').props('flat round color=negative').tooltip('Chiudi')
 
             ui.label('Elenco Persone Giuridiche').classes('text-base font-semibold mb-2')
 
             # Stato selezione tramite __rowid (stabile)
-            selected_rows: List[Dict[str, str]] = []
             def on_selection(e):
-                nonlocal selected_rows
-                selected_rows = e.selection or []
+                st.selected_rows[:] = e.selection or []
 
-            rows_table = _rows_for_table(persone)
-            table = ui.table(
+            st.table = ui.table(
                 columns=colonne,
-                rows=rows_table,
+                rows=_rows_for_table(persone),
                 row_key='__rowid',
                 selection='single',
                 on_select=on_selection,
                 pagination=10,
             ).classes('w-full text-sm border rounded-lg mb-3').props('dense flat bordered wrap-cells')
 
-            def refresh_table():
-                data = _carica_persone()
-                table.rows = _rows_for_table(data)
-                table.update()
-                selected_rows.clear()
+            refresh_table = st.refresh_table
+            selected_rows = st.selected_rows
 
             with ui.row().classes('gap-2 mb-4 flex-wrap'):
                 # MODIFICA
@@ -231,7 +289,7 @@ def mostra_popup_persone_giuridiche(callback_aggiungi: Optional[Callable[[List[D
                         _salva_persone(lista)
                         ui.notify('Riga aggiornata', type='positive')
                         refresh_table()
-                    _dialog_form('Modifica riga', keys, riga_sel, _salva_modifica)
+                    _dialog_form('Modifica riga', st.keys, riga_sel, _salva_modifica)
                 ui.button('Modifica', on_click=_azione_modifica).props('icon=edit color=secondary')
 
                 # ELIMINA
@@ -275,13 +333,14 @@ def mostra_popup_persone_giuridiche(callback_aggiungi: Optional[Callable[[List[D
                         _salva_persone(lista)
                         ui.notify('Nuova riga aggiunta', type='positive')
                         refresh_table()
-                    _dialog_form('Aggiungi nuova riga', keys, None, _salva_nuova)
+                    _dialog_form('Aggiungi nuova riga', st.keys, None, _salva_nuova)
                 ui.button('Aggiungi', on_click=_azione_aggiungi).props('icon=add color=primary')
 
                 # PASSA AD ANAGRAFICA
                 def _azione_aggiungi_ad_anagrafica():
                     if not selected_rows:
                         ui.notify('Seleziona una riga dalla tabella', type='warning'); return
+                    callback_aggiungi = st.callback_aggiungi
                     if callable(callback_aggiungi):
                         riga = dict(selected_rows[0])
                         riga.pop('__rowid', None)
@@ -298,8 +357,22 @@ def mostra_popup_persone_giuridiche(callback_aggiungi: Optional[Callable[[List[D
                 ui.button('Refresh', on_click=refresh_table).props('icon=refresh')
 
             with ui.row().classes('w-full justify-end items-center gap-2 mt-2'):
-                ui.button('', on_click=lambda *_: None or toggle_fullscreen(), icon='fullscreen').props('flat round').tooltip('Allarga/Riduci')
+                ui.button('', on_click=st.toggle_fullscreen, icon='fullscreen').props('flat round').tooltip('Allarga/Riduci')
                 ui.button('Chiudi', on_click=dialog.close).props('icon=close color=negative')
+    return st
 
-    dialog.open()
 
+def mostra_popup_persone_giuridiche(callback_aggiungi: Optional[Callable[[List[Dict[str, str]]], None]] = None):
+    """Apre il popup; il dialog viene costruito al primo uso e poi riaperto (solo refresh dati)."""
+    # via gli stati dei client chiusi (dialog già eliminato da NiceGUI)
+    for cid in [c for c, state in _STATES.items() if getattr(state.dialog, 'is_deleted', False)]:
+        del _STATES[cid]
+    client_id = ui.context.client.id
+    st = _STATES.get(client_id)
+    if st is not None:
+        st.callback_aggiungi = callback_aggiungi
+        st.refresh_table()
+    else:
+        st = _STATES[client_id] = _build_popup(_carica_persone())
+        st.callback_aggiungi = callback_aggiungi
+    st.dialog.open()
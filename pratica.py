@@ -4,20 +4,61 @@ Contiene la funzione per costruire la scheda 'Pratica' nell'interfaccia utente.
 """
 from __future__ import annotations
 
+import asyncio
 import os
+import shutil
+import subprocess
+import weakref
 from typing import List
 from nicegui import ui
 from utils_lookup import load_tariffe, load_tipo_pratica, load_settori, load_materie, load_avvocati
 
+# q-select con ricerca e virtual scroll: il menu materializza al più 20 opzioni alla volta
+_SELECT_PROPS = 'input-debounce=200 options-dense virtual-scroll-slice-size=20'
+_MULTI_SELECT_PROPS = _SELECT_PROPS + ' use-chips'
+
+# classi Tailwind condivise dalla scheda
+_CLS_CARD = 'w-full p-4 shadow-md'
+_CLS_HDR = 'text-lg font-bold mb-2'
+_CLS_COL = 'w-1/2 gap-4'
+_CLS_FIELD = 'w-full mb-2'
+_CLS_INFO = 'text-sm text-gray-600'
+_CLS_LABEL = 'font-medium'
+
+# numerazione delle righe tariffa lato browser (nessun relabel Python dopo una cancellazione)
+_TARIFFE_CSS = (
+    '<style>'
+    '.tariffa-list { counter-reset: tariffa; }'
+    '.tariffa-row::before { counter-increment: tariffa; content: "#" counter(tariffa); align-self: center; }'
+    '</style>'
+)
+# client che hanno già ricevuto _TARIFFE_CSS: lo <style> va nel <head> una volta
+# per pagina, non a ogni ricostruzione della scheda
+_TARIFFE_CSS_CLIENTS = weakref.WeakSet()
+
+
+def _add_tariffe_css() -> None:
+    client = ui.context.client
+    if client not in _TARIFFE_CSS_CLIENTS:
+        ui.add_head_html(_TARIFFE_CSS)
+        _TARIFFE_CSS_CLIENTS.add(client)
+
+
+# launcher per "Apri cartella", risolto una sola volta all'import
+_OPENER = None if os.name == 'nt' else (shutil.which('xdg-open') or shutil.which('open'))
+
 
 def _open_path(path: str) -> None:
+    # niente shell né attesa: il launcher parte in background, l'event loop non si blocca
     try:
         if os.name == 'nt':
             os.startfile(path)  # type: ignore
+        elif _OPENER:
+            subprocess.Popen([_OPENER, path], stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL, close_fds=True)
         elif os.name == 'posix':
-            # prova xdg-open, altrimenti 'open' (macOS)
-            if os.system(f'xdg-open "{path}" >/dev/null 2>&1') != 0:
-                os.system(f'open "{path}" >/dev/null 2>&1')
+            # sistema supportato, manca solo il launcher nel PATH
+            raise RuntimeError("comando 'xdg-open' (Linux) o 'open' (macOS) non trovato nel PATH")
         else:
             raise RuntimeError('Sistema non supportato')
     except Exception as e:
@@ -65,168 +106,196 @@ def costruisci_tab_pratica(id_pratica: str) -> dict:
     # contenitore per gestire i widget select delle tariffe (solo per UI)
     pratica_data['_tariffe_widgets'] = []
 
+    def _set(key: str):
+        # handler 'update:model-value' che scrive direttamente pratica_data[key]
+        return lambda e: pratica_data.__setitem__(key, e.args)
+
     with ui.row().classes('w-full no-wrap gap-4'):
         # Colonna sinistra - Informazioni base
-        with ui.column().classes('w-1/2 gap-4'):
-            with ui.card().classes('w-full p-4 shadow-md'):
-                ui.label('Informazioni Base').classes('text-lg font-bold mb-2')
+        with ui.column().classes(_CLS_COL):
+            with ui.card().classes(_CLS_CARD):
+                ui.label('Informazioni Base').classes(_CLS_HDR)
 
                 with ui.row().classes('items-center gap-4 mb-4'):
                     ui.label().bind_text_from(
                         pratica_data, 'id_pratica', lambda v: f'ID pratica: {v}'
-                    ).classes('text-sm text-gray-600')
+                    ).classes(_CLS_INFO)
                     ui.label().bind_text_from(
                         pratica_data, 'nome_pratica', lambda v: f'Nome pratica: {v or "-"}'
-                    ).classes('text-sm text-gray-600')
+                    ).classes(_CLS_INFO)
 
                 # Percorso pratica (readonly) + link aggiornabile
-                ui.input(label='Percorso pratica', value=pratica_data['percorso_pratica']) \
+                percorso_input = ui.input(label='Percorso pratica', value=pratica_data['percorso_pratica']) \
                     .props('readonly').classes('w-full mb-1') \
                     .bind_value(pratica_data, 'percorso_pratica')
 
+                # il callback cattura solo l'input (già legato a percorso_pratica), non l'intero dict
                 ui.button(
                     'Apri cartella',
                     icon='folder_open',
-                    on_click=lambda: _open_path(pratica_data.get('percorso_pratica', '') or '')
+                    on_click=lambda: _open_path(percorso_input.value or '')
                 ).props('color=primary flat')
 
-                ui.label('Data apertura *').classes('font-medium')
-                ui.date().classes('w-full mb-2').on(
+                ui.label('Data apertura *').classes(_CLS_LABEL)
+                ui.date().classes(_CLS_FIELD).on(
                     'update:model-value',
-                    lambda e: pratica_data.update({'data_apertura': e.args})
+                    _set('data_apertura')
                 ).tooltip('Campo obbligatorio')
 
-                ui.label('Data chiusura').classes('font-medium')
+                ui.label('Data chiusura').classes(_CLS_LABEL)
                 ui.date().classes('w-full').on(
                     'update:model-value',
-                    lambda e: pratica_data.update({'data_chiusura': e.args})
+                    _set('data_chiusura')
                 )
 
         # Colonna destra - Dettagli pratica
-        with ui.column().classes('w-1/2 gap-4'):
-            with ui.card().classes('w-full p-4 shadow-md'):
-                ui.label('Dettagli Pratica').classes('text-lg font-bold mb-2')
+        with ui.column().classes(_CLS_COL):
+            with ui.card().classes(_CLS_CARD) as dettagli_card:
+                ui.label('Dettagli Pratica').classes(_CLS_HDR)
 
-                ui.input(label='Valore pratica *').classes('w-full mb-2') \
-                    .on('update:model-value', lambda e: pratica_data.update({'valore_pratica': e.args})) \
+                ui.input(label='Valore pratica *').classes(_CLS_FIELD) \
+                    .on('update:model-value', _set('valore_pratica')) \
                     .tooltip('Campo obbligatorio')
 
-                ui.select(TIPI, label='Tipo pratica *').classes('w-full mb-2') \
-                    .on('update:model-value', lambda e: pratica_data.update({'tipo_pratica': e.args})) \
+                ui.select(TIPI, label='Tipo pratica *', with_input=True).props(_SELECT_PROPS) \
+                    .classes(_CLS_FIELD) \
+                    .on('update:model-value', _set('tipo_pratica')) \
                     .tooltip('Campo obbligatorio')
 
                 # select con refresher live
-                pratica_data['settore_element'] = ui.select(SETTORI, label='Settore pratica') \
-                    .classes('w-full mb-2') \
-                    .on('update:model-value', lambda e: pratica_data.update({'settore_pratica': e.args}))
+                pratica_data['settore_element'] = ui.select(SETTORI, label='Settore pratica', with_input=True) \
+                    .props(_SELECT_PROPS) \
+                    .classes(_CLS_FIELD) \
+                    .on('update:model-value', _set('settore_pratica'))
 
-                pratica_data['materia_element'] = ui.select(MATERIE, label='Materia della pratica') \
-                    .classes('w-full mb-2') \
-                    .on('update:model-value', lambda e: pratica_data.update({'materia_pratica': e.args}))
+                pratica_data['materia_element'] = ui.select(MATERIE, label='Materia della pratica', with_input=True) \
+                    .props(_SELECT_PROPS) \
+                    .classes(_CLS_FIELD) \
+                    .on('update:model-value', _set('materia_pratica'))
 
                 # --- REFRESHERS per aggiornare in tempo reale le select ---
+                # chiave lookup -> (loader, [(chiave widget in pratica_data, multiple)])
+                _refreshable = {
+                    'settori': (load_settori, (('settore_element', False),)),
+                    'materie': (load_materie, (('materia_element', False),)),
+                    'avvocati': (load_avvocati, (('avv_referente_element', False),
+                                                 ('avv_mandato_element', True))),
+                }
+
+                def _restore_selection(sel, cur, options_set: set, multiple: bool):
+                    if multiple:
+                        sel.value = [v for v in (cur or []) if v in options_set]
+                    elif cur in options_set:
+                        sel.value = cur
+
+                async def refresh_all_async(which=('settori', 'materie', 'avvocati')):
+                    # un solo load per file richiesto, su thread di lavoro; gli update() finiscono
+                    # nello stesso frame websocket
+                    for key in which:
+                        try:
+                            loader, targets = _refreshable[key]
+                            nuovi = await asyncio.to_thread(loader)
+                            nuovi_set = set(nuovi)
+                            for el_key, multiple in targets:
+                                sel = pratica_data[el_key]
+                                old = getattr(sel, 'options', None)
+                                # file invariato: il loader memoizzato restituisce la stessa lista
+                                if old is nuovi or old == nuovi:
+                                    continue
+                                cur = getattr(sel, 'value', None)
+                                sel.options = nuovi
+                                _restore_selection(sel, cur, nuovi_set, multiple)
+                                sel.update()
+                        except Exception as e:
+                            ui.notify(f'Errore refresh {key}: {e}', type='negative')
+
+                def refresh_all(which=('settori', 'materie', 'avvocati')):
+                    # entry point sincrono per i callback dei popup: schedula la versione async
+                    with dettagli_card:
+                        ui.timer(0, lambda: refresh_all_async(which), once=True)
+
                 def refresh_settori():
-                    try:
-                        nuovi = load_settori()
-                        sel = pratica_data['settore_element']
-                        cur = getattr(sel, 'value', None)
-                        sel.options = nuovi
-                        if cur in nuovi:
-                            sel.value = cur
-                        sel.update()
-                    except Exception as e:
-                        ui.notify(f'Errore refresh settori: {e}', type="negative")
+                    refresh_all(('settori',))
 
                 def refresh_materie():
-                    try:
-                        nuove = load_materie()
-                        sel = pratica_data['materia_element']
-                        cur = getattr(sel, 'value', None)
-                        sel.options = nuove
-                        if cur in nuove:
-                            sel.value = cur
-                        sel.update()
-                    except Exception as e:
-                        ui.notify(f'Errore refresh materie: {e}', type="negative")
+                    refresh_all(('materie',))
 
                 def refresh_avvocati():
-                    try:
-                        nuovi = load_avvocati()
-                        sel_ref = pratica_data['avv_referente_element']
-                        sel_mand = pratica_data['avv_mandato_element']
-                        cur_ref = getattr(sel_ref, 'value', None)
-                        cur_mand = (getattr(sel_mand, 'value', None) or [])
-                        sel_ref.options = nuovi
-                        if cur_ref in nuovi:
-                            sel_ref.value = cur_ref
-                        sel_ref.update()
-                        sel_mand.options = nuovi
-                        sel_mand.value = [v for v in cur_mand if v in nuovi]
-                        sel_mand.update()
-                    except Exception as e:
-                        ui.notify(f'Errore refresh avvocati: {e}', type='negative')
-
-            with ui.card().classes('w-full p-4 shadow-md'):
-                ui.label('Avvocati').classes('text-lg font-bold mb-2')
+                    refresh_all(('avvocati',))
+
+            with ui.card().classes(_CLS_CARD):
+                ui.label('Avvocati').classes(_CLS_HDR)
 
                 pratica_data['avv_referente_element'] = ui.select(
                     AVVOCATI,
-                    label='Avvocato referente *'
-                ).classes('w-full mb-2') \
-                 .on('update:model-value', lambda e: pratica_data.update({'avvocato_referente': e.args})) \
+                    label='Avvocato referente *',
+                    with_input=True,
+                ).props(_SELECT_PROPS).classes(_CLS_FIELD) \
+                 .on('update:model-value', _set('avvocato_referente')) \
                  .tooltip('Campo obbligatorio')
 
                 pratica_data['avv_mandato_element'] = ui.select(
                     AVVOCATI,
                     label='Avvocati in mandato',
-                    multiple=True
-                ).classes('w-full mb-2') \
-                 .on('update:model-value', lambda e: pratica_data.update({'avvocato_in_mandato': e.args or []}))
+                    multiple=True,
+                    with_input=True,
+                ).props(_MULTI_SELECT_PROPS).classes(_CLS_FIELD) \
+                 .on('update:model-value', lambda e: pratica_data.__setitem__('avvocato_in_mandato', e.args or []))
 
-            with ui.card().classes('w-full p-4 shadow-md'):
-                ui.label('Altre Informazioni').classes('text-lg font-bold mb-2')
+            with ui.card().classes(_CLS_CARD):
+                ui.label('Altre Informazioni').classes(_CLS_HDR)
 
                 ui.checkbox('Preventivo inviato') \
-                    .on('update:model-value', lambda e: pratica_data.update({'preventivo_inviato': bool(e.args)})) \
+                    .on('update:model-value', lambda e: pratica_data.__setitem__('preventivo_inviato', bool(e.args))) \
                     .classes('mb-2')
 
                 ui.textarea(label='Note') \
-                    .on('update:model-value', lambda e: pratica_data.update({'note': e.args})) \
-                    .classes('w-full mb-2')
+                    .on('update:model-value', _set('note')) \
+                    .classes(_CLS_FIELD)
 
-            with ui.card().classes('w-full p-4 shadow-md'):
-                ui.label('Tariffe').classes('text-lg font-bold mb-2')
+            with ui.card().classes(_CLS_CARD):
+                ui.label('Tariffe').classes(_CLS_HDR)
 
-                tipo_tariffa_container = ui.column().classes('w-full gap-2 mb-2')
+                _add_tariffe_css()
+                tipo_tariffa_container = ui.column().classes('w-full gap-2 mb-2 tariffa-list')
 
-                def _make_tariffa_row(idx: int, value: str | None = None):
-                    # crea una riga con select + bottone elimina
-                    row = ui.row().classes('items-end gap-2 w-full')
+                def _make_tariffa_row(value: str | None = None):
+                    # crea una riga con select + bottone elimina (sempre dentro il contenitore)
+                    with tipo_tariffa_container:
+                        row = ui.row().classes('items-end gap-2 w-full tariffa-row')
                     with row:
-                        sel = ui.select(TARIFFE, label=f'Tipo di tariffa #{idx + 1}', value=value) \
-                            .classes('w-full')
-                        # aggiorna la lista stringhe
-                        sel.on('update:model-value', lambda e, i=idx: _set_tariffa(i, e.args))
-                        ui.button('', icon='delete', on_click=lambda i=idx: _remove_tariffa(i)) \
+                        sel = ui.select(TARIFFE, label='Tipo di tariffa', value=value,
+                                        with_input=True) \
+                            .props(_SELECT_PROPS).classes('w-full')
+                        # aggiorna la lista stringhe (indice risolto dal widget, mai catturato)
+                        sel.on('update:model-value', lambda e, s=sel: _set_tariffa_by_widget(s, e.args))
+                        ui.button('', icon='delete', on_click=lambda s=sel: _remove_tariffa_by_widget(s)) \
                             .props('color=negative flat')
 
                     # memorizza widget e contenitore
                     pratica_data['_tariffe_widgets'].append((row, sel))
 
+                def _index_of(sel) -> int:
+                    for k, (_, w) in enumerate(pratica_data['_tariffe_widgets']):
+                        if w is sel:
+                            return k
+                    return -1
+
                 def _set_tariffa(i: int, v: str | None):
                     # estendi lista se necessario
                     while len(pratica_data['tipo_tariffe']) <= i:
                         pratica_data['tipo_tariffe'].append(None)
                     pratica_data['tipo_tariffe'][i] = v
 
-                def _reindex_tariffe_widgets():
-                    # rinomina le label in base al nuovo indice
-                    for i, (row, sel) in enumerate(pratica_data['_tariffe_widgets']):
-                        try:
-                            sel.label = f'Tipo di tariffa #{i + 1}'
-                            sel.update()
-                        except Exception:
-                            pass
+                def _set_tariffa_by_widget(sel, v: str | None):
+                    i = _index_of(sel)
+                    if i >= 0:
+                        _set_tariffa(i, v)
+
+                def _remove_tariffa_by_widget(sel):
+                    i = _index_of(sel)
+                    if i >= 0:
+                        _remove_tariffa(i)
 
                 def _remove_tariffa(i: int):
                     # rimuovi i-esima riga
@@ -238,28 +307,26 @@ def costruisci_tab_pratica(id_pratica: str) -> dict:
                             pass
                     if 0 <= i < len(pratica_data['tipo_tariffe']):
                         pratica_data['tipo_tariffe'].pop(i)
-                    _reindex_tariffe_widgets()
 
                 def aggiungi_tariffa():
-                    idx = len(pratica_data['_tariffe_widgets'])
-                    _make_tariffa_row(idx)
-
-                with tipo_tariffa_container:
-                    # inizialmente vuoto; l'utente può aggiungere righe
-                    pass
+                    _make_tariffa_row()
 
                 with ui.row().classes('w-full justify-end gap-2'):
                     ui.button('Aggiungi tariffa', on_click=aggiungi_tariffa) \
                         .props('icon=add color=positive')
-                    ui.button('Elimina tutte', on_click=lambda: (
-                        [row.delete() for row, _ in pratica_data['_tariffe_widgets']],
-                        pratica_data['_tariffe_widgets'].clear(),
+
+                    def _elimina_tutte():
+                        # un solo clear() del contenitore invece di N row.delete()
+                        tipo_tariffa_container.clear()
+                        pratica_data['_tariffe_widgets'].clear()
                         pratica_data['tipo_tariffe'].clear()
-                    )).props('icon=delete color=negative')
+
+                    ui.button('Elimina tutte', on_click=_elimina_tutte).props('icon=delete color=negative')
 
         # Rendi richiamabili dall’esterno (per popup che aggiornano i JSON)
         pratica_data['refresh_settori'] = refresh_settori
         pratica_data['refresh_materie'] = refresh_materie
         pratica_data['refresh_avvocati'] = refresh_avvocati
+        pratica_data['refresh_all'] = refresh_all
 
     return pratica_data
@@ -1,8 +1,17 @@
 # --- preventivi_tariffe.py (patched con micro-migliorie) ---
 from __future__ import annotations
+import asyncio
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
 from typing import Dict, List, Callable, Optional
 from nicegui import ui
 
+log = logging.getLogger("preventivi_tariffe")
+
 # --- PDF export: import sicuro e wrapper -------------------------------------
 try:
     import tabelle_ministeriali_safe as _tm
@@ -25,22 +34,46 @@ def export_pdf_singolo(dati, metadata, sezione):
         return _tm.genera_pdf_singolo(dati, metadata, sezione)
     ui.notify("Export PDF non disponibile (installare wkhtmltopdf/pdfkit).", type="warning")
 
-def export_pdf_tutte(pratica_data, sezione):
+async def export_pdf_tutte(pratica_data, sezione):
     key = 'preventivi' if sezione == 'contenzioso' else 'preventivi_stragiudiziale'
     items = (pratica_data.get(key) or {})
     if not isinstance(items, dict) or not items:
         ui.notify('Nessuna tabella da esportare.', type='info'); return
     if not (_tm and PDF_OK and hasattr(_tm, "genera_pdf_singolo")):
         ui.notify("Export PDF non disponibile (installare wkhtmltopdf/pdfkit).", type="warning"); return
+    pairs = [(((obj or {}).get('dati', {}) or {}), ((obj or {}).get('metadata', {}) or {})) for obj in items.values()]
     ok = 0; fail = 0
-    for _, obj in items.items():
-        try:
-            dati = (obj or {}).get('dati', {}) or {}
-            md = (obj or {}).get('metadata', {}) or {}
-            _tm.genera_pdf_singolo(dati, md, sezione)  # ogni chiamata attiva un download
+    if hasattr(_tm, "render_pdf_singolo") and hasattr(_tm, "wkhtmltopdf_config"):
+        # un processo wkhtmltopdf per tabella, ma in parallelo; i download restano sul client
+        config = _tm.wkhtmltopdf_config()
+        if config is None:
+            ui.notify('wkhtmltopdf non trovato. Installa il pacchetto di sistema o imposta il path.', type='negative')
+            return
+        indici = range(1, len(pairs) + 1) if len(pairs) > 1 else [None]
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as ex:
+            futures = [loop.run_in_executor(ex, _tm.render_pdf_singolo, d, m, sezione, config, i)
+                       for (d, m), i in zip(pairs, indici)]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+        first_err: Optional[BaseException] = None
+        for res in results:
+            if isinstance(res, BaseException):
+                log.error("Export PDF %s fallito", sezione, exc_info=res)
+                first_err = first_err or res
+                fail += 1
+                continue
+            pdf, nome = res
+            ui.download(pdf, nome)
             ok += 1
-        except Exception:
-            fail += 1
+        if first_err is not None:
+            ui.notify(f"Errore durante la generazione del PDF: {first_err}", type='negative')
+    else:
+        for dati, md in pairs:
+            try:
+                _tm.genera_pdf_singolo(dati, md, sezione)  # ogni chiamata attiva un download
+                ok += 1
+            except Exception:
+                fail += 1
     ui.notify(f'Export {sezione}: {ok} file generati' + (f' — {fail} errori' if fail else ''), type=('positive' if ok else 'warning'))
 
 def _on_upload(e, pratica_data, refresh_callback, sezione):
@@ -50,44 +83,98 @@ def _on_upload(e, pratica_data, refresh_callback, sezione):
 # -----------------------------------------------------------------------------
 
 
+@lru_cache(maxsize=4096)
+def _fmt_cents(cents: int) -> str:
+    return f"{cents / 100:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+_UN_CENTESIMO = Decimal('0.01')
+
+def _round_cents(x: float) -> int:
+    """Centesimi arrotondati per eccesso sul mezzo centesimo (0,005 -> 0,01),
+       sulla rappresentazione decimale di x e non sul binario di x * 100."""
+    return int(Decimal(repr(x)).quantize(_UN_CENTESIMO, rounding=ROUND_HALF_UP).scaleb(2))
+
+
 def fmt(x: float) -> str:
-    s = f"{x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    return s
+    # gli importi sono sempre al centesimo: la cache è per centesimi
+    x = float(x)
+    if not math.isfinite(x):
+        return f"{x:,.2f}"
+    return _fmt_cents(_round_cents(x))
 
 
 # ---------- Helper parsing/somme ----------
+# cache stringa -> valore: i totali ricorrenti (0,00, subtotali) vengono parsati una volta sola
+_EURO_CACHE_MAX = 4096
+_euro_cache: Dict[str, float] = {}
+
+_EURO_STRIP = str.maketrans('', '', '€ \xa0\t')
+
 def _parse_euro(v) -> float:
     if v is None:
         return 0.0
-    s = str(v).strip()
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v)
+    raw = str(v)
+    hit = _euro_cache.get(raw)
+    if hit is not None:
+        return hit
+    s = raw.translate(_EURO_STRIP)
     if not s:
         return 0.0
-    s = s.replace('€', '').replace(' ', '')
-    if ',' in s and '.' in s:
-        s = s.replace('.', '').replace(',', '.')
-    else:
-        s = s.replace(',', '.')
+    # con entrambi i separatori il decimale è l'ultimo: 1.234,56 / 1,234.56
+    if ',' in s:
+        if '.' in s and s.rfind('.') > s.rfind(','):
+            s = s.replace(',', '')
+        else:
+            s = s.replace('.', '').replace(',', '.')
+    elif s.count('.') > 1:
+        s = s.replace('.', '')  # 1.234.567
     try:
-        return float(s)
-    except Exception:
-        return 0.0
+        val = float(s)
+    except ValueError:
+        val = 0.0
+    if len(_euro_cache) >= _EURO_CACHE_MAX:
+        _euro_cache.clear()
+    _euro_cache[raw] = val
+    return val
+
+# chiave del totale già parsato nelle righe serializzate, in centesimi interi
+# ('_ui_*' non viene salvato, vedi to_jsonable)
+_TOT_KEY = '_ui_cents'
+
+def _cents(x: float) -> int:
+    try:
+        return _round_cents(float(x))
+    except (TypeError, ValueError, OverflowError, ArithmeticError):
+        return 0
+
+def _remove_by_identity(lst: list, obj) -> bool:
+    """list.remove per identità: righe vuote diverse sono dict uguali per valore."""
+    for i in range(len(lst) - 1, -1, -1):
+        if lst[i] is obj:
+            del lst[i]
+            return True
+    return False
+
+def _cents_riga(r: Dict) -> int:
+    c = r.get(_TOT_KEY)
+    return c if c is not None else _cents(_parse_euro(r.get('tot')))
 
 def _somma_tariffe(pratica_data: Dict, sezione: str) -> float:
-    key = f"tariffe_{sezione}"
-    totale = 0.0
-    blocco = pratica_data.get(key, {}) or {}
-    for _tipo, righe in (blocco.items() if isinstance(blocco, dict) else []):
-        for r in righe or []:
-            totale += _parse_euro((r or {}).get('tot'))
-    return totale
+    blocco = pratica_data.get(f"tariffe_{sezione}") or {}
+    if not isinstance(blocco, dict):
+        return 0.0
+    # somma esatta su interi; si torna a euro solo alla fine
+    return sum(_cents_riga(r) for righe in blocco.values() for r in (righe or ()) if r) / 100
 
 def _somma_tabelle(pratica_data: Dict, sezione: str) -> float:
     key = 'preventivi' if sezione == 'contenzioso' else 'preventivi_stragiudiziale'
-    totale = 0.0
-    for _k, obj in ((pratica_data.get(key, {}) or {}).items() if isinstance(pratica_data.get(key, {}), dict) else []):
-        dati = (obj or {}).get('dati', {}) or {}
-        totale += _parse_euro(dati.get('totale_documento'))
-    return totale
+    blocco = pratica_data.get(key) or {}
+    if not isinstance(blocco, dict):
+        return 0.0
+    return math.fsum(_parse_euro(((obj or {}).get('dati') or {}).get('totale_documento')) for obj in blocco.values())
 # ------------------------------------------------------
 
 
@@ -166,15 +253,27 @@ def gestisci_sezione_tariffe(pratica_data: Dict, sezione: str, tipi_tariffe: lis
     titolo = 'Contenzioso' if sezione == 'contenzioso' else 'Attività Stragiudiziali'
     totale_label = ui.label('Totale: € 0,00').classes('text-lg font-bold text-right text-blue-900 w-full')
 
+    # ultimo stato mostrato: se le somme non cambiano non si riformatta né si ridisegna
+    _last = {'tar': None, 'tab': None, 'tar_s': '', 'tab_s': '', 'text': ''}
+
     def update_totale():
         tar = _somma_tariffe(pratica_data, sezione)
         tab = _somma_tabelle(pratica_data, sezione)
+        if tar == _last['tar'] and tab == _last['tab']:
+            return
+        if tar != _last['tar']:
+            _last['tar'], _last['tar_s'] = tar, fmt(tar)
+        if tab != _last['tab']:
+            _last['tab'], _last['tab_s'] = tab, fmt(tab)
         tot = tar + tab
-        totale_label.text = f"Totale {titolo}: € {fmt(tot)}   (Tariffe: € {fmt(tar)} — Tabelle: € {fmt(tab)})"
-        try:
-            totale_label.update()
-        except Exception:
-            pass
+        text = f"Totale {titolo}: € {fmt(tot)}   (Tariffe: € {_last['tar_s']} — Tabelle: € {_last['tab_s']})"
+        if text != _last['text']:
+            _last['text'] = text
+            totale_label.text = text
+            try:
+                totale_label.update()
+            except Exception:
+                pass
         if totale_out is not None:
             totale_out['val'] = tot
         if on_update_totale:
@@ -184,13 +283,27 @@ def gestisci_sezione_tariffe(pratica_data: Dict, sezione: str, tipi_tariffe: lis
         tariffe_tab = ui.tab('Tariffe')
         tabelle_tab = ui.tab('Tabelle Ministeriali')
 
+    # update_totale coalescente: più on_change ravvicinati (es. le 6 card in costruzione) => un solo ricalcolo
+    totale_pending = {'v': False}
+
+    def _flush_totale():
+        totale_pending['v'] = False
+        update_totale()
+
+    def schedule_totale():
+        if totale_pending['v']:
+            return
+        totale_pending['v'] = True
+        with tariffe_col:
+            ui.timer(0.05, _flush_totale, once=True)
+
     with ui.tab_panels(tabs, value=tariffe_tab).classes('w-full'):
         # ---- TARIFFE
         with ui.tab_panel(tariffe_tab):
-            with ui.column().classes('w-full gap-4'):
+            with ui.column().classes('w-full gap-4') as tariffe_col:
                 for tipo in tipi_tariffe:
-                    TariffaManager(tipo, pratica_data, f'tariffe_{sezione}', on_change=update_totale).crea_interfaccia()
-            ui.timer(0.05, update_totale, once=True)
+                    TariffaManager(tipo, pratica_data, f'tariffe_{sezione}', on_change=schedule_totale).crea_interfaccia()
+            schedule_totale()
 
         # ---- TABELLE
         with ui.tab_panel(tabelle_tab):
@@ -227,6 +340,38 @@ class TariffaManager:
         self.categoria = categoria  # es. 'tariffe_contenzioso'
         self.righe: List[Dict] = []
         self.on_change = on_change or (lambda: None)
+        # debounce: una raffica di input produce un solo aggiorna_dati + on_change
+        self._pending = False
+        self._card = None
+        # righe serializzate, allineate a self.righe (+ quelle non montate in coda):
+        # è la stessa lista salvata in pratica_data e ogni modifica la aggiorna sul posto
+        self._serialized: List[Dict] = []
+        # righe salvate non ancora montate (dict serializzati, in ordine)
+        self._non_montate: List[Dict] = []
+        self._rows_box = None
+        self._more_btn = None
+        # id widget -> (riga, campo): un solo handler condiviso per tutti gli input
+        self._row_by_el: Dict[int, tuple] = {}
+
+    _DEBOUNCE_S = 0.15
+    # quante righe salvate montare per volta: con centinaia di righe il costo
+    # è nella creazione dei widget, non nei dati
+    _BLOCCO_RIGHE = 30
+
+    def _schedule(self) -> None:
+        if self._pending:
+            return
+        if self._card is None:
+            self._flush()
+            return
+        self._pending = True
+        with self._card:
+            ui.timer(self._DEBOUNCE_S, self._flush, once=True)
+
+    def _flush(self) -> None:
+        self._pending = False
+        self.aggiorna_dati()
+        self.on_change()
 
     def _fmt_num(self, x: float) -> str:
         try:
@@ -244,6 +389,7 @@ class TariffaManager:
         minuti = _parse_euro(row.get('tempo_stimato').value if row.get('tempo_stimato') else 0)
         if tariffa or minuti:
             val = (tariffa / 60.0) * minuti
+            row['_tot_float'] = val
             row['tot'].value = self._fmt_num(val)
             try:
                 row['tot'].update()
@@ -259,6 +405,7 @@ class TariffaManager:
                 tot = (valore * perc) / 100.0
             except Exception:
                 tot = 0.0
+            row['_tot_float'] = tot
             row['tot'].value = self._fmt_num(tot)
             try:
                 row['tot'].update()
@@ -269,19 +416,25 @@ class TariffaManager:
         minuti = _parse_euro(row.get('tempo_stimato').value if row.get('tempo_stimato') else 0)
         if tariffa or minuti:
             val = (tariffa / 60.0) * minuti
+            row['_tot_float'] = val
             row['tot'].value = self._fmt_num(val)
             try:
                 row['tot'].update()
             except Exception:
                 pass
 
+    def _on_tot_edit(self, row: Dict) -> None:
+        """Totale inserito a mano (Base, Forfait, ...): aggiorna il valore numerico in cache."""
+        row['_tot_float'] = _parse_euro(row['tot'].value)
+
     # --- UI ---
     def crea_interfaccia(self) -> None:
         """Crea la card per il tipo tariffa e popola le righe da pratica_data se presenti."""
         # leggi eventuali righe già salvate
         salvate: List[Dict] = (self.pratica_data.get(self.categoria, {}) or {}).get(self.tipo, []) or []
 
-        with ui.card().classes('w-full shadow-sm'):
+        with ui.card().classes('w-full shadow-sm') as card:
+            self._card = card
             with ui.card_section():
                 # intestazione + prima riga
                 with ui.row().classes('w-full items-center gap-2') as row_elem:
@@ -310,7 +463,7 @@ class TariffaManager:
 
                     ui.button('+', on_click=self.aggiungi_riga)                         .props('round dense color=positive')                         .classes('w-8 h-8')
 
-                first_row = {'row': row_elem, 'note': input_note, 'tot': input_tot, 'is_first': True}
+                first_row = {'row': row_elem, 'note': input_note, 'tot': input_tot, 'is_first': True, '_tot_float': 0.0}
                 if self.tipo == 'Oraria':
                     first_row['tariffa_oraria'] = input_tariffa
                     first_row['tempo_stimato'] = input_minuti
@@ -320,59 +473,147 @@ class TariffaManager:
                 self.righe.append(first_row)
 
                 # attach eventi (dopo che first_row esiste)
-                if self.tipo == 'Oraria':
-                    input_tariffa.on('update:model-value', lambda e: (self._ricalcola_tot_oraria(first_row), self.aggiorna_dati(), self.on_change()))
-                    input_minuti.on('update:model-value',  lambda e: (self._ricalcola_tot_oraria(first_row), self.aggiorna_dati(), self.on_change()))
-                    # rimosso handler su input_tot (ora readonly)
-                elif self.tipo == 'A Percentuale':
-                    input_valore.on('update:model-value',      lambda e: (self._ricalcola_tot_percentuale(first_row), self.aggiorna_dati(), self.on_change()))
-                    input_percentuale.on('update:model-value', lambda e: (self._ricalcola_tot_percentuale(first_row), self.aggiorna_dati(), self.on_change()))
-                else:
-                    input_tot.on('update:model-value', lambda e: (self.aggiorna_dati(), self.on_change()))
+                self._bind_row(first_row)
 
-                # popolamento da dati salvati (se esistono), altrimenti default
-                def _apply_values_to_row(row: Dict, data: Dict):
-                    row['note'].value = data.get('note', '')
-                    row['tot'].value = data.get('tot', '')
-                    if 'tariffa_oraria' in row and row['tariffa_oraria']:
-                        row['tariffa_oraria'].value = data.get('tariffa_oraria', '')
-                    if 'tempo_stimato' in row and row['tempo_stimato']:
-                        row['tempo_stimato'].value = data.get('tempo_stimato', '')
-                    if 'valore' in row and row['valore']:
-                        row['valore'].value = data.get('valore', '')
-                    if 'percentuale' in row and row['percentuale']:
-                        row['percentuale'].value = data.get('percentuale', '')
-                    try:
-                        row['note'].update(); row['tot'].update()
-                    except Exception:
-                        pass
+                # righe aggiuntive in un contenitore dedicato: il pulsante '+' e
+                # "Mostra altre" le accodano qui, sotto la prima riga
+                self._rows_box = ui.column().classes('w-full gap-2')
+                self._more_btn = ui.button('', on_click=self._monta_altre).props('flat dense color=primary')
 
+                # popolamento da dati salvati (se esistono), altrimenti default
+                salvate = [d for d in salvate if isinstance(d, dict)]
+                self._serialized = salvate or [{}]
+                first_row['_d'] = self._serialized[0]
                 if salvate:
-                    # prima riga dai dati[0]
-                    _apply_values_to_row(first_row, salvate[0])
-                    # righe successive
-                    for data in salvate[1:]:
-                        self.aggiungi_riga()
-                        last = self.righe[-1]
-                        _apply_values_to_row(last, data)
-                    # ricalcoli iniziali ove necessario
-                    if self.tipo == 'Oraria':
-                        for r in self.righe:
-                            self._ricalcola_tot_oraria(r)
-                    if self.tipo == 'A Percentuale':
-                        for r in self.righe:
-                            self._ricalcola_tot_percentuale(r)
-                else:
-                    # ricalcolo iniziale se serve
-                    if self.tipo == 'Oraria':
-                        self._ricalcola_tot_oraria(first_row)
-                    if self.tipo == 'A Percentuale':
-                        self._ricalcola_tot_percentuale(first_row)
+                    self._apply_values_to_row(first_row, salvate[0])
+                    # solo il primo blocco viene montato; il resto resta come dati puri
+                    self._non_montate = salvate[1:]
+                    for d in self._non_montate:
+                        d[_TOT_KEY] = _cents(_parse_euro(d.get('tot')))
+                    self._monta_altre()
+                self._ricalcola(first_row)
+                self._sync_row(first_row)
+                self._aggiorna_more_btn()
 
                 self.aggiorna_dati()
                 self.on_change()
 
+    def _apply_values_to_row(self, row: Dict, data: Dict) -> None:
+        row['note'].value = data.get('note', '')
+        row['tot'].value = data.get('tot', '')
+        row['_tot_float'] = _parse_euro(row['tot'].value)
+        if 'tariffa_oraria' in row and row['tariffa_oraria']:
+            row['tariffa_oraria'].value = data.get('tariffa_oraria', '')
+        if 'tempo_stimato' in row and row['tempo_stimato']:
+            row['tempo_stimato'].value = data.get('tempo_stimato', '')
+        if 'valore' in row and row['valore']:
+            row['valore'].value = data.get('valore', '')
+        if 'percentuale' in row and row['percentuale']:
+            row['percentuale'].value = data.get('percentuale', '')
+        try:
+            row['note'].update(); row['tot'].update()
+        except Exception:
+            pass
+
+    def _ricalcola(self, row: Dict) -> None:
+        if self.tipo == 'Oraria':
+            self._ricalcola_tot_oraria(row)
+        elif self.tipo == 'A Percentuale':
+            self._ricalcola_tot_percentuale(row)
+
+    def _sync_row(self, row: Dict) -> None:
+        """Copia i valori dei widget della riga nel suo dict serializzato."""
+        d = row['_d']
+        d['note'] = row['note'].value
+        d['tot'] = row['tot'].value
+        d[_TOT_KEY] = _cents(row.get('_tot_float', 0.0))
+        if self.tipo == 'Oraria':
+            d['tariffa_oraria'] = row['tariffa_oraria'].value if row.get('tariffa_oraria') else ''
+            d['tempo_stimato'] = row['tempo_stimato'].value if row.get('tempo_stimato') else ''
+        if self.tipo == 'A Percentuale':
+            d['valore'] = row['valore'].value if row.get('valore') else ''
+            d['percentuale'] = row['percentuale'].value if row.get('percentuale') else ''
+
+    def _edit(self, row: Dict) -> None:
+        self._sync_row(row)
+        self._schedule()
+
+    # campi che, modificati, fanno ricalcolare il totale della riga
+    _CAMPI_ORARIA = ('tariffa_oraria', 'tempo_stimato')
+    _CAMPI_PERCENTUALE = ('valore', 'percentuale')
+
+    def _bind_row(self, row: Dict) -> None:
+        """Registra gli input della riga sull'handler condiviso `_on_input`."""
+        campi = ['note']
+        if self.tipo == 'Oraria':
+            campi += self._CAMPI_ORARIA
+        elif self.tipo == 'A Percentuale':
+            campi += self._CAMPI_PERCENTUALE
+        else:
+            campi.append('tot')  # per Oraria/A Percentuale il totale è readonly
+        for campo in campi:
+            el = row.get(campo)
+            if el is not None:
+                self._row_by_el[el.id] = (row, campo)
+                el.on('update:model-value', self._on_input)
+
+    def _unbind_row(self, row: Dict) -> None:
+        for campo in ('note', 'tot') + self._CAMPI_ORARIA + self._CAMPI_PERCENTUALE:
+            el = row.get(campo)
+            if el is not None:
+                self._row_by_el.pop(el.id, None)
+
+    def _on_input(self, e) -> None:
+        hit = self._row_by_el.get(e.sender.id)
+        if hit is None:
+            return
+        row, campo = hit
+        if campo in self._CAMPI_ORARIA:
+            self._ricalcola_tot_oraria(row)
+        elif campo in self._CAMPI_PERCENTUALE:
+            self._ricalcola_tot_percentuale(row)
+        elif campo == 'tot':
+            self._on_tot_edit(row)
+        self._edit(row)
+
+    def _aggiorna_more_btn(self) -> None:
+        if self._more_btn is None:
+            return
+        n = len(self._non_montate)
+        self._more_btn.text = f'Mostra altre {n} righe'
+        self._more_btn.set_visibility(n > 0)
+
+    def _monta_altre(self) -> None:
+        """Monta il prossimo blocco di righe salvate ancora non renderizzate."""
+        blocco = self._non_montate[:self._BLOCCO_RIGHE]
+        self._non_montate = self._non_montate[self._BLOCCO_RIGHE:]
+        for data in blocco:
+            # il dict salvato (già in self._serialized) diventa quello della riga
+            riga = self._crea_riga(data)
+            self._apply_values_to_row(riga, data)
+            self._ricalcola(riga)
+            self._sync_row(riga)
+        self._aggiorna_more_btn()
+        if blocco:
+            self._schedule()
+
     def aggiungi_riga(self) -> None:
+        riga = self._crea_riga({})
+        # subito dopo le righe montate, prima di quelle ancora da montare
+        self._serialized.insert(len(self.righe) - 1, riga['_d'])
+        self._ricalcola(riga)
+        self._edit(riga)
+
+    def _crea_riga(self, data: Dict) -> Dict:
+        if self._rows_box is None:
+            riga = self._crea_riga_ui()
+        else:
+            with self._rows_box:
+                riga = self._crea_riga_ui()
+        riga['_d'] = data
+        return riga
+
+    def _crea_riga_ui(self) -> Dict:
         with ui.row().classes('w-full items-center gap-2 pl-10') as row_elem:
             ui.label(f"Aggiuntiva").classes('w-32 text-sm text-gray-500')
             input_note = ui.input(label='Note').props('dense').classes('flex-grow')
@@ -394,7 +635,7 @@ class TariffaManager:
                 input_tot = ui.input(label='€').props('dense').classes('w-32')
 
             # placeholder dict per catturare 'riga' nelle lambda
-            riga = {'row': row_elem, 'note': input_note, 'tot': input_tot, 'is_first': False}
+            riga = {'row': row_elem, 'note': input_note, 'tot': input_tot, 'is_first': False, '_tot_float': 0.0}
             if self.tipo == 'Oraria':
                 riga['tariffa_oraria'] = input_tariffa
                 riga['tempo_stimato'] = input_minuti
@@ -403,28 +644,12 @@ class TariffaManager:
                 riga['percentuale'] = input_percentuale
 
             # attach eventi (dopo dizionario creato)
-            input_note.on('update:model-value', lambda e: (self.aggiorna_dati(), self.on_change()))
-            if self.tipo == 'Oraria':
-                input_tariffa.on('update:model-value', lambda e, r=riga: (self._ricalcola_tot_oraria(r), self.aggiorna_dati(), self.on_change()))
-                input_minuti.on('update:model-value',  lambda e, r=riga: (self._ricalcola_tot_oraria(r), self.aggiorna_dati(), self.on_change()))
-                # rimosso handler su input_tot (ora readonly)
-            elif self.tipo == 'A Percentuale':
-                input_valore.on('update:model-value',      lambda e, r=riga: (self._ricalcola_tot_percentuale(r), self.aggiorna_dati(), self.on_change()))
-                input_percentuale.on('update:model-value', lambda e, r=riga: (self._ricalcola_tot_percentuale(r), self.aggiorna_dati(), self.on_change()))
-            else:
-                input_tot.on('update:model-value', lambda e: (self.aggiorna_dati(), self.on_change()))
+            self._bind_row(riga)
 
             ui.button('-', on_click=lambda r=riga: self.rimuovi_riga(r))                 .props('round dense color=negative')                 .classes('w-8 h-8')
 
             self.righe.append(riga)
-
-        # ricalcolo immediato
-        if self.tipo == 'Oraria':
-            self._ricalcola_tot_oraria(riga)
-        if self.tipo == 'A Percentuale':
-            self._ricalcola_tot_percentuale(riga)
-        self.aggiorna_dati()
-        self.on_change()
+        return riga
 
     def rimuovi_riga(self, riga: Dict) -> None:
         try:
@@ -432,25 +657,16 @@ class TariffaManager:
                 riga['row'].delete()
         except Exception:
             pass
-        self.righe = [r for r in self.righe if r != riga]
-        self.aggiorna_dati()
-        self.on_change()
+        self._unbind_row(riga)
+        # rimozione sul posto: niente ricostruzione delle liste né riserializzazione
+        _remove_by_identity(self.righe, riga)
+        _remove_by_identity(self._serialized, riga.get('_d'))
+        self._schedule()
 
     def aggiorna_dati(self) -> None:
+        """Le righe sono già serializzate riga per riga: garantisce solo che
+        pratica_data punti a self._serialized."""
         if self.categoria not in self.pratica_data:
             self.pratica_data[self.categoria] = {}
-        righe_serializzate = []
-        for r in self.righe:
-            row_dict = {
-                'note': r['note'].value,
-                'tot': r['tot'].value,
-            }
-            if self.tipo == 'Oraria':
-                row_dict['tariffa_oraria'] = r.get('tariffa_oraria').value if r.get('tariffa_oraria') else ''
-                row_dict['tempo_stimato'] = r.get('tempo_stimato').value if r.get('tempo_stimato') else ''
-            if self.tipo == 'A Percentuale':
-                row_dict['valore'] = r.get('valore').value if r.get('valore') else ''
-                row_dict['percentuale'] = r.get('percentuale').value if r.get('percentuale') else ''
-            righe_serializzate.append(row_dict)
-
-        self.pratica_data[self.categoria][self.tipo] = righe_serializzate
+        if self.pratica_data[self.categoria].get(self.tipo) is not self._serialized:
+            self.pratica_data[self.categoria][self.tipo] = self._serialized
@@ -1,13 +1,47 @@
 from __future__ import annotations
-import os, json, sqlite3, hashlib
+import os, json, sqlite3, hashlib, logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import Tuple
 
+log = logging.getLogger("reindex")
+
 SKIP_DIRS = {".git", ".hg", ".svn", ".venv", "venv", "node_modules", "__pycache__"}
 
-def sha256_text(s: str) -> str:
-    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+# L'hash serve solo a capire se un pratica.json è cambiato dall'ultimo indice:
+# non serve robustezza crittografica, quindi si preferisce il più veloce disponibile.
+try:
+    import blake3  # type: ignore
+
+    def content_hash_bytes(b: bytes) -> str:
+        return blake3.blake3(b).hexdigest(16)
+except Exception:
+    try:
+        import xxhash  # type: ignore
+
+        def content_hash_bytes(b: bytes) -> str:
+            return xxhash.xxh128_hexdigest(b)
+    except Exception:
+        def content_hash_bytes(b: bytes) -> str:
+            return hashlib.sha256(b).hexdigest()
+
+try:
+    import orjson  # type: ignore
+    _loads = orjson.loads
+except Exception:
+    orjson = None  # type: ignore
+    _loads = json.loads
+
+# sole chiavi (di primo livello) che finiscono nell'indice
+_INDEX_FIELDS = ("id_pratica", "nome_pratica", "settore_pratica", "materia_pratica", "valore_pratica", "updated_at")
+
+def _index_fields(raw: bytes) -> dict:
+    """Estrae da `raw` solo i campi indicizzati, senza tenere in vita il dict completo."""
+    data = _loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("la radice non è un oggetto")
+    return {k: data[k] for k in _INDEX_FIELDS if k in data}
 
 def _open_db(db_path: Path) -> sqlite3.Connection:
     db_path.parent.mkdir(parents=True, exist_ok=True)
@@ -16,6 +50,10 @@ def _open_db(db_path: Path) -> sqlite3.Connection:
     con.execute("PRAGMA journal_mode=WAL;")
     con.execute("PRAGMA synchronous=NORMAL;")
     con.execute("PRAGMA foreign_keys=ON;")
+    con.execute("PRAGMA temp_store=MEMORY;")
+    con.execute("PRAGMA cache_size=-65536;")  # ~64 MiB
+    # niente checkpoint del WAL a metà di un import massivo
+    con.execute("PRAGMA wal_autocheckpoint=10000;")
     return con
 
 def ensure_index(db_path: Path) -> None:
@@ -33,38 +71,100 @@ def ensure_index(db_path: Path) -> None:
                 hash TEXT
             );
         """)
+        # firma del file (mtime, dimensione): se invariata il file non viene riletto.
+        # Il confronto usa mtime_ns (intero, esatto); mtime REAL resta per chi lo legge
+        for col in ("mtime REAL", "size INTEGER", "mtime_ns INTEGER"):
+            try:
+                cur.execute(f"ALTER TABLE pratiche ADD COLUMN {col};")
+            except sqlite3.OperationalError:
+                pass  # colonna già presente
         # indici utili per ricerche/filtri
         cur.execute("CREATE INDEX IF NOT EXISTS idx_pratiche_nome    ON pratiche(nome);")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_pratiche_settore ON pratiche(settore);")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_pratiche_materia ON pratiche(materia);")
+        # filtri combinati settore+materia ordinati per nome, e liste per data
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pratiche_set_mat_nome ON pratiche(settore, materia, nome);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_pratiche_updated ON pratiche(updated_at);")
         con.commit()
 
+def _iter_pratica_entries(root: Path):
+    """Itera su (path, stat) di tutti i file pratica.json, saltando directory di servizio."""
+    # os.scandir riusa il tipo restituito da readdir: niente stat() per le directory
+    stack = [os.fspath(root)]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                name = e.name
+                try:
+                    is_dir = e.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    if name not in SKIP_DIRS:
+                        stack.append(e.path)
+                elif name == "pratica.json":
+                    try:
+                        st = e.stat()
+                    except OSError:
+                        continue
+                    yield Path(e.path), st
+
 def _iter_pratica_json(root: Path):
     """Itera su tutti i file pratica.json, saltando directory di servizio."""
-    for dirpath, dirnames, filenames in os.walk(root):
-        # filtra sottodirectory rumorose in-place
-        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
-        if "pratica.json" in filenames:
-            yield Path(dirpath) / "pratica.json"
+    for p, _st in _iter_pratica_entries(root):
+        yield p
 
-def _load_pratica_json(p: Path) -> tuple[dict, str] | None:
+def _load_pratica_json(p: Path, known_hash: str | None = None) -> tuple[dict | None, str] | None:
+    """Legge `p` e ne calcola l'hash sui byte grezzi.
+    Restituisce (campi indicizzati, hash); se l'hash coincide con `known_hash`
+    il JSON non viene nemmeno parsato e si restituisce (None, hash).
+    """
     try:
-        data = json.loads(p.read_text(encoding="utf-8"))
-        # normalizza hashing con sort_keys=True per stabilità
-        norm = json.dumps(data, ensure_ascii=False, sort_keys=True)
-        return data, sha256_text(norm)
+        raw = p.read_bytes()
+        h = content_hash_bytes(raw)
+        if known_hash is not None and h == known_hash:
+            return None, h
+        return _index_fields(raw), h
     except Exception as e:
-        print(f"SKIP {p}: invalid json ({e})")
+        log.warning("SKIP %s: invalid json (%s)", p, e)
         return None
 
-def _iso_from_mtime(p: Path) -> str:
+# sotto questa soglia il costo di avvio del pool supera il guadagno
+_PARALLEL_MIN_FILES = 64
+
+def _load_all(paths: list[Path], known: list[str | None],
+              workers: int | None = None, threads: bool = True):
+    """Carica e calcola l'hash dei file in parallelo, restituendo i risultati nell'ordine di `paths`.
+    Processi solo con threads=False (CLI): dentro il server NiceGUI un fork del
+    processo dell'event loop si porterebbe dietro thread e socket."""
+    if workers == 1 or len(paths) < _PARALLEL_MIN_FILES:
+        yield from map(_load_pratica_json, paths, known)
+        return
+    workers = workers or os.cpu_count() or 1
+    pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with pool(max_workers=workers) as ex:
+        # i risultati vengono consumati man mano che arrivano
+        yield from ex.map(_load_pratica_json, paths, known, chunksize=32)
+
+def _iso_from_mtime(p: Path, mtime: float | None = None) -> str:
     try:
-        return datetime.fromtimestamp(p.stat().st_mtime).isoformat(timespec="seconds")
+        if mtime is None:
+            mtime = p.stat().st_mtime
+        return datetime.fromtimestamp(mtime).isoformat(timespec="seconds")
     except Exception:
         return datetime.now().isoformat(timespec="seconds")
 
-def reindex(root: Path, db_path: Path, purge: bool = False) -> Tuple[int, int]:
+def reindex(root: Path, db_path: Path, purge: bool = False,
+            workers: int | None = None, threads: bool = True) -> Tuple[int, int]:
     """Indicizza tutte le pratiche JSON in SQLite.
+    Lettura e hashing dei file avvengono in un pool di thread (sicuro anche
+    dentro l'app); `threads=False` usa un pool di processi ed è pensato per la
+    CLI. La scrittura su SQLite resta sul thread principale.
     Ritorna (insert_count, update_count).
     """
     ensure_index(db_path)
@@ -72,12 +172,9 @@ def reindex(root: Path, db_path: Path, purge: bool = False) -> Tuple[int, int]:
 
     with _open_db(db_path) as con:
         cur = con.cursor()
-        if purge:
-            cur.execute("DELETE FROM pratiche;")
-
         upsert_sql = """
-            INSERT INTO pratiche (id, nome, settore, materia, valore, updated_at, path, hash)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO pratiche (id, nome, settore, materia, valore, updated_at, path, hash, mtime, mtime_ns, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(id) DO UPDATE SET
                 nome=excluded.nome,
                 settore=excluded.settore,
@@ -85,49 +182,106 @@ def reindex(root: Path, db_path: Path, purge: bool = False) -> Tuple[int, int]:
                 valore=excluded.valore,
                 updated_at=excluded.updated_at,
                 path=excluded.path,
-                hash=excluded.hash
+                hash=excluded.hash,
+                mtime=excluded.mtime,
+                mtime_ns=excluded.mtime_ns,
+                size=excluded.size
             ;
         """
 
-        for p in _iter_pratica_json(root):
-            loaded = _load_pratica_json(p)
+        # stato attuale dell'indice letto una volta sola
+        rows = [] if purge else cur.execute("SELECT id, hash, path, mtime_ns, size FROM pratiche").fetchall()
+        existing = {idp: (h, path) for idp, h, path, _m, _s in rows}          # id -> (hash, path)
+        by_path = {path: (h, m, sz, idp) for idp, h, path, m, sz in rows}   # cartella -> (hash, mtime_ns, size, id)
+        del rows
+        to_upsert: list[tuple] = []
+        to_touch: list[tuple] = []
+
+        # stessa firma (mtime_ns, size) dell'ultimo indice: il file non viene neanche
+        # letto. Nanosecondi interi: nessun arrotondamento float può nascondere una
+        # riscrittura della stessa dimensione
+        paths: list[Path] = []
+        sigs: list[tuple[float, int, int]] = []
+        known: list[str | None] = []
+        known_ids: list[str | None] = []
+        for p, st in _iter_pratica_entries(root):
+            cached = by_path.get(str(p.parent))
+            if cached is not None and cached[1] == st.st_mtime_ns and cached[2] == st.st_size:
+                continue
+            paths.append(p)
+            sigs.append((st.st_mtime, st.st_mtime_ns, st.st_size))
+            known.append(cached[0] if cached is not None else None)
+            known_ids.append(cached[3] if cached is not None else None)
+
+        for p, (mtime, mtime_ns, size), known_id, loaded in zip(paths, sigs, known_ids,
+                                                                _load_all(paths, known, workers, threads)):
             if not loaded:
                 continue
             data, h = loaded
+            if data is None:
+                # stessi byte ma firma cambiata (es. touch): aggiorna solo la firma
+                to_touch.append((mtime, mtime_ns, size, known_id))
+                continue
             idp      = (data.get("id_pratica") or "").strip()
             if not idp:
-                print(f"SKIP {p}: id_pratica mancante")
+                log.warning("SKIP %s: id_pratica mancante", p)
+                continue
+            pathstr  = str(p.parent)
+
+            prev = existing.get(idp)
+            if prev is not None and prev == (h, pathstr):
+                # contenuto e posizione invariati: basta aggiornare la firma
+                to_touch.append((mtime, mtime_ns, size, idp))
                 continue
+            if prev is None:
+                inserted_cnt += 1
+            elif prev[0] != h:
+                updated_cnt += 1
+            existing[idp] = (h, pathstr)
+
             nome     = (data.get("nome_pratica") or None)
             settore  = (data.get("settore_pratica") or None)
             materia  = (data.get("materia_pratica") or None)
             valore   = (data.get("valore_pratica") or None)
-            updated_ts = (data.get("updated_at") or _iso_from_mtime(p))
-            pathstr  = str(p.parent)
+            updated_ts = (data.get("updated_at") or _iso_from_mtime(p, mtime))
+            to_upsert.append((idp, nome, settore, materia, valore, updated_ts, pathstr, h, mtime, mtime_ns, size))
 
-            # verifica se esiste già e se l'hash cambia
-            cur.execute("SELECT hash FROM pratiche WHERE id=?", (idp,))
-            row = cur.fetchone()
-            existed = row is not None
-            old_hash = row[0] if existed else None
-
-            cur.execute(upsert_sql, (idp, nome, settore, materia, valore, updated_ts, pathstr, h))
-            if existed:
-                if old_hash != h:
-                    updated_cnt += 1
-            else:
-                inserted_cnt += 1
+        # scansione e parsing avvengono fuori transazione; la scrittura è
+        # un'unica transazione, così il lock è tenuto solo per il batch
+        cur.execute("BEGIN IMMEDIATE;")
+        try:
+            if purge:
+                cur.execute("DELETE FROM pratiche;")
+            if to_upsert:
+                cur.executemany(upsert_sql, to_upsert)
+            if to_touch:
+                # per id (chiave primaria): un WHERE path scansionerebbe la tabella a ogni file
+                cur.executemany("UPDATE pratiche SET mtime=?, mtime_ns=?, size=? WHERE id=?", to_touch)
+            cur.execute("COMMIT;")
+        except BaseException:
+            cur.execute("ROLLBACK;")
+            raise
 
-        con.commit()
+        # statistiche per il planner: complete dopo un import, incrementali altrimenti
+        if to_upsert or purge:
+            con.execute("ANALYZE;")
+        else:
+            con.execute("PRAGMA optimize;")
 
-    print(f"Index OK: inserite {inserted_cnt}, aggiornate {updated_cnt}")
+    log.info("Index OK: inserite %d, aggiornate %d", inserted_cnt, updated_cnt)
     return inserted_cnt, updated_cnt
 
 if __name__ == "__main__":
     import argparse
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     ap = argparse.ArgumentParser(description="Rebuild/Update indice.sqlite from pratica.json files")
     ap.add_argument("--root", required=True, type=Path, help="Root folder containing practice folders")
     ap.add_argument("--db", required=True, type=Path, help="SQLite file path to write")
-    ap.add_argument("--purge", action="store_true", help="Svuota e ricrea completamente l'indice prima dell'import")
+    ap.add_argument("--purge", action="store_true", help="Svuota e ricrea completamente l'indice prima dell'import "
+                         "(nota: se cambia l'algoritmo di hash disponibile, il primo run senza --purge "
+                         "segnala tutte le pratiche come aggiornate)")
+    ap.add_argument("--workers", type=int, default=None, help="Numero di worker per lettura/hash (default: numero di CPU, 1 = seriale)")
+    ap.add_argument("--threads", action="store_true", help="Usa thread invece di processi per la lettura dei file")
     args = ap.parse_args()
-    reindex(args.root, args.db, purge=args.purge)
+    # da riga di comando il processo è nostro: di default pool di processi
+    reindex(args.root, args.db, purge=args.purge, workers=args.workers, threads=args.threads)
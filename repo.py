@@ -1,40 +1,113 @@
 from __future__ import annotations
-import json, time, os, hashlib
+import json, time, os, hashlib, threading
 from pathlib import Path
-from contextlib import contextmanager
-from typing import Optional, Dict, Any, Union
+from collections import OrderedDict
+from contextlib import contextmanager, ExitStack
+from typing import Optional, Dict, Any, Union, List, Tuple
 from datetime import datetime
 from models import Pratica
-from history import append_history
+from history import enqueue_history
+
+try:
+    import orjson  # type: ignore
+    _loads = orjson.loads
+except Exception:
+    orjson = None  # type: ignore
+    _loads = json.loads
 
 # ---------------- utils ----------------
 
 def _now_iso() -> str:
     return datetime.now().isoformat(timespec="seconds")
 
-def _canonical_json(obj: Any) -> str:
-    """JSON stabile per confronti/diff (mantiene liste, ordina solo le chiavi dict)."""
-    if obj is None:
-        return "null"
-    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+def _pretty_json_bytes(obj: Any) -> bytes:
+    """JSON indentato in UTF-8, pronto da scrivere su disco."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+def _fsync_dir(folder: Path) -> None:
+    """Rende durevole la rename dentro 'folder' (no-op dove non supportato)."""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
 
-def _atomic_write_text(path: Path, text: str) -> None:
-    """Scrittura atomica robusta su stesso filesystem (tmp + fsync + replace)."""
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        n = os.write(fd, view)
+        view = view[n:]
+
+def _atomic_write_text(path: Path, text: Union[str, bytes]) -> None:
+    """Scrittura atomica robusta su stesso filesystem (tmp + fsync + replace).
+       Con O_DSYNC la durabilità è inclusa nella write: niente fsync separato
+       del file; resta l'fsync della directory, che rende durevole la rename.
+    """
     path.parent.mkdir(parents=True, exist_ok=True)
     tmp = path.with_suffix(path.suffix + ".tmp")
-    with open(tmp, "w", encoding="utf-8") as f:
-        f.write(text)
+    data = text.encode("utf-8") if isinstance(text, str) else text
+    if hasattr(os, "O_DSYNC"):
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DSYNC, 0o644)
         try:
-            f.flush()
-            os.fsync(f.fileno())
-        except Exception:
-            # su alcuni FS non è necessario/permesso
-            pass
+            _write_all(fd, data)
+        finally:
+            os.close(fd)
+    else:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            try:
+                f.flush()
+                os.fsync(f.fileno())
+            except Exception:
+                # su alcuni FS non è necessario/permesso
+                pass
     os.replace(tmp, path)
+    _fsync_dir(path.parent)
+
+# lock advisory del kernel: il processo in attesa dorme e il lock sparisce da
+# solo se il proprietario muore (niente TTL né file stantii)
+try:
+    import fcntl  # POSIX
+except ImportError:
+    fcntl = None  # type: ignore
+try:
+    import msvcrt  # Windows
+except ImportError:
+    msvcrt = None  # type: ignore
+
+def _try_lock_fd(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)  # type: ignore[union-attr]
+        return True
+    except OSError:
+        return False
+
+def _unlock_fd(fd: int) -> None:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)  # type: ignore[union-attr]
+    except OSError:
+        pass
 
 @contextmanager
-def _lock(path: Path, timeout: float = 10.0, stale: float = 30.0):
-    """Lock file semplice con TTL: evita corruzione su scritture concorrenti."""
+def _lock_polling(path: Path, timeout: float = 10.0, stale: float = 30.0):
+    """Lock file semplice con TTL (fallback senza fcntl/msvcrt)."""
     lock = path.with_suffix(path.suffix + ".lock")
     start = time.monotonic()
     while lock.exists():
@@ -61,39 +134,134 @@ def _lock(path: Path, timeout: float = 10.0, stale: float = 30.0):
         except Exception:
             pass
 
-def _read_existing(p: Path) -> Optional[Dict[str, Any]]:
-    if not p.exists():
-        return None
+@contextmanager
+def _lock(path: Path, timeout: float = 10.0, stale: float = 30.0):
+    """Lock esclusivo su <path>.lock: evita corruzione su scritture concorrenti."""
+    if fcntl is None and msvcrt is None:
+        with _lock_polling(path, timeout=timeout, stale=stale):
+            yield
+        return
+    lock = path.with_suffix(path.suffix + ".lock")
+    # il file di lock resta su disco: rimuoverlo mentre un altro processo lo
+    # attende permetterebbe a due processi di "possedere" file diversi
+    fd = os.open(lock, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        start = time.monotonic()
+        delay = 0.002
+        while not _try_lock_fd(fd):
+            if time.monotonic() - start > timeout:
+                raise TimeoutError(f"Timeout acquisizione lock su {path}")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            _unlock_fd(fd)
+    finally:
+        os.close(fd)
+
+def _digest(payload: bytes) -> bytes:
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+def _compare_existing(p: Path, digest: bytes, after: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """(before, invariato). I bytes su disco si confrontano col digest del
+       payload; si fa il parse solo se differiscono (serve per la history e per
+       riconoscere file equivalenti scritti con altro ordine/formattazione)."""
     try:
-        return json.loads(p.read_text(encoding="utf-8"))
+        raw = p.read_bytes()
+    except OSError:
+        return None, False
+    if _digest(raw) == digest:
+        return None, True
+    try:
+        before = _loads(raw)
     except Exception:
+        return None, False
+    return before, before == after
+
+def _file_sig(p: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = p.stat()
+    except OSError:
         return None
+    return (st.st_mtime_ns, st.st_size)
+
+# ultimo contenuto scritto/letto per cartella: digest del payload + firma del
+# file (mtime_ns, size). Se il file non è stato toccato da altri e il digest
+# coincide, il salvataggio è un no-op senza rileggere pratica.json.
+# LRU limitata a _WRITTEN_MAX cartelle: un'uscita dalla cache costa solo
+# una scrittura in più, non un salvataggio perso.
+_WRITTEN: "OrderedDict[str, Tuple[bytes, Tuple[int, int]]]" = OrderedDict()
+_WRITTEN_MAX = 1024
+_WRITTEN_LOCK = threading.Lock()
+
+def _remember(folder: Path, digest: bytes, p: Path) -> None:
+    sig = _file_sig(p)
+    key = str(folder)
+    with _WRITTEN_LOCK:
+        if sig is None:
+            _WRITTEN.pop(key, None)
+            return
+        _WRITTEN[key] = (digest, sig)
+        _WRITTEN.move_to_end(key)
+        while len(_WRITTEN) > _WRITTEN_MAX:
+            _WRITTEN.popitem(last=False)
+
+def _unchanged_since_last_write(folder: Path, digest: bytes, p: Path) -> bool:
+    with _WRITTEN_LOCK:
+        cached = _WRITTEN.get(str(folder))
+        if cached is not None:
+            _WRITTEN.move_to_end(str(folder))
+    if cached is None or cached[0] != digest:
+        return False
+    sig = _file_sig(p)
+    if sig is None:
+        with _WRITTEN_LOCK:
+            _WRITTEN.pop(str(folder), None)
+        return False
+    return cached[1] == sig
+
+def _with_updated_at(after: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """updated_at di default se assente, su una copia superficiale: il dict
+       del chiamante (spesso lo stato vivo della UI) non viene mai modificato."""
+    if after is None:
+        return {"updated_at": _now_iso()}
+    if "updated_at" in after:
+        return after
+    return {**after, "updated_at": _now_iso()}
 
 def _save_dict(folder: Path, after: Dict[str, Any], actor: str = "system") -> Path:
     """Routine condivisa: salva dict in pratica.json con lock, atomico e history."""
-    folder.mkdir(parents=True, exist_ok=True)
     p = folder / "pratica.json"
 
-    with _lock(p):
-        before = _read_existing(p)
+    # default updated_at se assente
+    after = _with_updated_at(after)
+    # una sola serializzazione: gli stessi bytes servono per digest e scrittura
+    payload = _pretty_json_bytes(after)
+    after_digest = _digest(payload)
 
-        # default updated_at se assente
-        after = dict(after) if after is not None else {}
-        after.setdefault("updated_at", _now_iso())
+    # autosave ripetuti con lo stesso contenuto: confronto in RAM + stat,
+    # senza lock, lettura del file né history (file sparito => firma None)
+    if _unchanged_since_last_write(folder, after_digest, p):
+        return p
 
-        # confronta contenuti canonici per evitare riscritture inutili
-        before_canon = _canonical_json(before) if before is not None else None
-        after_canon = _canonical_json(after)
-        if before_canon == after_canon:
+    folder.mkdir(parents=True, exist_ok=True)
+    with _lock(p):
+        if _unchanged_since_last_write(folder, after_digest, p):
+            return p
+
+        before, unchanged = _compare_existing(p, after_digest, after)
+        if unchanged:
             # nessun cambiamento: esci silenziosamente
+            _remember(folder, after_digest, p)
             return p
 
         # scrittura atomica
-        pretty = json.dumps(after, ensure_ascii=False, indent=2)
-        _atomic_write_text(p, pretty)
+        _atomic_write_text(p, payload)
+        _remember(folder, after_digest, p)
 
-        # history
-        append_history(folder, actor=actor, action="save_pratica", before=before, after=after)
+        # history: accodata (diff e append fuori dal lock, a lotti)
+        enqueue_history(folder, actor=actor, action="save_pratica", before=before, after=payload)
 
     return p
 
@@ -104,15 +272,13 @@ def load_pratica(folder: Path) -> Pratica:
     if not p.exists():
         raise FileNotFoundError(f"Manca {p}")
     try:
-        data = json.loads(p.read_text(encoding="utf-8"))
+        data = _loads(p.read_bytes())
     except Exception as e:
         raise ValueError(f"JSON non valido in {p}: {e}") from e
     return Pratica(**data)
 
-def save_pratica(pratica: Pratica, folder: Path, actor: str = "system") -> Path:
-    """Scrive pratica.json + history.jsonl in modo sicuro/atomico.
-       Se i contenuti non cambiano, non riscrive e non aggiunge history.
-    """
+def _pratica_to_dict(pratica: Pratica) -> Dict[str, Any]:
+    """Aggiorna updated_at sull'istanza e la serializza in dict JSON-compatibile."""
     # aggiorna updated_at anche sull'istanza, se presente
     try:
         if hasattr(pratica, "updated_at"):
@@ -121,16 +287,85 @@ def save_pratica(pratica: Pratica, folder: Path, actor: str = "system") -> Path:
         pass
 
     try:
-        after: Dict[str, Any] = pratica.model_dump(mode="json")  # Pydantic v2
-    except Exception as e:
+        return pratica.model_dump(mode="json")  # Pydantic v2
+    except Exception:
         # fallback: tentativo generico (Pydantic v1 o dataclass-like)
         try:
-            after = json.loads(json.dumps(pratica, default=lambda o: getattr(o, "dict", lambda: str(o))()))
+            return json.loads(json.dumps(pratica, default=lambda o: getattr(o, "dict", lambda: str(o))()))
         except Exception as e2:
             raise ValueError(f"Impossibile serializzare la pratica: {e2}") from e2
 
+def save_pratica(pratica: Pratica, folder: Path, actor: str = "system") -> Path:
+    """Scrive pratica.json + history.jsonl in modo sicuro/atomico.
+       Se i contenuti non cambiano, non riscrive e non aggiunge history.
+    """
+    after = _pratica_to_dict(pratica)
     return _save_dict(Path(folder), after, actor=actor)
 
+def save_pratica_batch(items: List[Tuple[Union[Pratica, Dict[str, Any]], Path]], actor: str = "system") -> List[Path]:
+    """Salva più pratiche con una sola attesa del disco per tutto il lotto.
+       Prende i lock di tutte le cartelle (in ordine, niente deadlock), scrive
+       tutti i tmp, poi fsync di ciascuno, rename e un fsync per cartella.
+       Le pratiche invariate non vengono riscritte né finiscono in history.
+       Se una scrittura fallisce i descrittori vengono chiusi e i tmp non
+       ancora rinominati rimossi: nessun pratica.json resta a metà.
+    """
+    # a parità di cartella vince l'ultima occorrenza
+    per_folder: Dict[Path, Dict[str, Any]] = {}
+    for pratica, folder in items:
+        after = pratica if isinstance(pratica, dict) else _pratica_to_dict(pratica)
+        per_folder.pop(Path(folder), None)
+        per_folder[Path(folder)] = after
+
+    with ExitStack() as stack:
+        for folder in sorted(per_folder, key=str):
+            folder.mkdir(parents=True, exist_ok=True)
+            stack.enter_context(_lock(folder / "pratica.json"))
+
+        pending: List[Tuple[Path, Path, Path, Optional[Dict[str, Any]], bytes, bytes]] = []
+        renamed = 0
+        try:
+            fds: List[int] = []
+            try:
+                for folder, after in per_folder.items():
+                    p = folder / "pratica.json"
+                    after = _with_updated_at(after)
+                    payload = _pretty_json_bytes(after)
+                    after_digest = _digest(payload)
+                    before, unchanged = _compare_existing(p, after_digest, after)
+                    if unchanged:
+                        _remember(folder, after_digest, p)
+                        continue
+                    tmp = p.with_suffix(p.suffix + ".tmp")
+                    fds.append(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
+                    pending.append((folder, p, tmp, before, payload, after_digest))
+                    # fd aperto fino all'fsync: tutte le write partono prima di
+                    # attendere il disco
+                    _write_all(fds[-1], payload)
+                # fsync dei soli file del lotto (non sync() globale)
+                for fd in fds:
+                    os.fsync(fd)
+            finally:
+                for fd in fds:
+                    os.close(fd)
+            for folder, p, tmp, _before, _payload, after_digest in pending:
+                os.replace(tmp, p)
+                renamed += 1
+                _remember(folder, after_digest, p)
+        except BaseException:
+            for _folder, _p, tmp, _before, _payload, _digest_ in pending[renamed:]:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+            raise
+        for folder in {item[0] for item in pending}:
+            _fsync_dir(folder)
+        for folder, _p, _tmp, before, payload, _digest_ in pending:
+            enqueue_history(folder, actor=actor, action="save_pratica", before=before, after=payload)
+
+    return [folder / "pratica.json" for folder in per_folder]
+
 def write_pratica(folder: Path, data: Union[Dict[str, Any], Pratica], actor: str = "system") -> Path:
     """Variante che accetta direttamente un dict (o un'istanza Pratica).
        Converte e delega alla routine condivisa, con lock/atomico/history.
@@ -139,7 +374,4 @@ def write_pratica(folder: Path, data: Union[Dict[str, Any], Pratica], actor: str
         return save_pratica(data, folder, actor=actor)
     if not isinstance(data, dict):
         raise TypeError("write_pratica: 'data' deve essere dict o Pratica")
-    # garantisci updated_at
-    data = dict(data)
-    data.setdefault("updated_at", _now_iso())
     return _save_dict(Path(folder), data, actor=actor)
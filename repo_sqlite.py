@@ -22,15 +22,43 @@ queries.
 
 from __future__ import annotations
 
+import hashlib
 import json
+import mmap
 import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
 from db_core import get_connection as _get_connection, atomic_tx
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from db_core import atomic_tx
 
+try:
+    import orjson  # type: ignore
+    _loads = orjson.loads
+except Exception:
+    orjson = None  # type: ignore
+    _loads = json.loads
+
+
+def _dumps(obj: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:
+            # chiavi non stringa, interi oltre 64 bit...: ci pensa json
+            pass
+    return json.dumps(obj, ensure_ascii=False)
+
 DB_PATH = os.environ.get('GP_DB_PATH', os.path.join('archivio', '0gp.sqlite'))
 
+# file di pratica nell'archivio: "pratica*.json" oppure "<n>_<anno>.json"
+_PRATICA_FNAME_RE = re.compile(r'\d+_\d+\.json$')
+_JSON_EXT = '.json'
+
 @contextmanager
 def get_connection():
     """Wrapper: restituisce una connessione pronta all'uso al DB predefinito."""
@@ -42,12 +70,43 @@ def _ensure_uid(item: Dict[str, Any]) -> str:
     u = (item.get("uid") or "").strip()
     if u: 
         return u
-    # se l'UI non fornisce uid, ne creiamo uno (meglio farlo in UI!)
-    import uuid
-    u = uuid.uuid4().hex
+    # se l'UI non fornisce uid, ne creiamo uno (meglio farlo in UI!):
+    # 32 caratteri esadecimali casuali, come uuid4().hex ma senza formattazione
+    u = os.urandom(16).hex()
     item["uid"] = u
     return u
 
+# identificatori SQL ammessi nelle query costruite a runtime (tabelle/colonne
+# arrivano dal codice, mai dall'utente: il controllo è una rete di sicurezza)
+_IDENT_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+def _check_idents(*names: str) -> None:
+    for n in names:
+        if not _IDENT_RE.fullmatch(n):
+            raise ValueError(f"Identificatore SQL non valido: {n!r}")
+
+@lru_cache(maxsize=None)
+def _merge_sql(table: str, parent_col: str, order_field: str, db_cols: Tuple[str, ...]) -> Tuple[str, str, str]:
+    """SQL di merge_children per una tabella: costruito una volta sola, quindi
+    testo identico a ogni chiamata e sempre servito dalla cache di statement."""
+    cols = [parent_col, "uid", order_field, *db_cols]
+    _check_idents(table, *cols)
+    delete = (f"DELETE FROM {table} WHERE {parent_col}=? "
+              f"AND uid NOT IN (SELECT value FROM json_each(?))")
+    # uid già usati da righe di un'altra pratica (l'UPSERT le salterebbe)
+    foreign = (f"SELECT uid, {parent_col} FROM {table} "
+               f"WHERE uid IN (SELECT value FROM json_each(?)) AND {parent_col} IS NOT ? LIMIT 1")
+    placeholders = ",".join("?" for _ in cols)
+    set_list = ", ".join(f"{c}=excluded.{c}" for c in cols[2:])  # non cambiamo parent_col, uid
+    changed = " OR ".join(f"{table}.{c} IS NOT excluded.{c}" for c in cols[2:])
+    # il WHERE è una seconda difesa contro righe con lo stesso uid ma di
+    # un'altra pratica (merge_children le rifiuta prima), e lascia intatte
+    # (nessuna scrittura) le righe identiche
+    upsert = (f"INSERT INTO {table}({', '.join(cols)}) VALUES({placeholders}) "
+              f"ON CONFLICT(uid) DO UPDATE SET {set_list} "
+              f"WHERE {table}.{parent_col}=excluded.{parent_col} AND ({changed})")
+    return delete, upsert, foreign
+
 def merge_children(con, *, table: str, parent_col: str, parent_id: str,
                    rows: List[Dict[str, Any]], colmap: Dict[str,str],
                    order_field: str = "pos", delete_missing: bool = True) -> None:
@@ -55,42 +114,130 @@ def merge_children(con, *, table: str, parent_col: str, parent_id: str,
     Merge incrementale di una tabella figlia (1→N) basato su uid.
     - colmap: mappa {campo_UI: colonna_DB}
     - rows devono contenere 'uid' stabile. Se manca lo generiamo (consigliato averlo in UI).
+    Il confronto avviene tutto in SQLite: un DELETE delle righe il cui uid non
+    è più presente e un UPSERT nativo su uid (indice uq_<table>_uid, vedi
+    db_migrations) che aggiorna solo le righe cambiate; quelle identiche non
+    vengono toccate. Un uid ripetuto in `rows` o già usato da un'altra
+    pratica solleva sqlite3.IntegrityError (nessuna riga viene scartata in
+    silenzio).
     """
-    # 1) snapshot uids esistenti
-    existing = { r[0] for r in con.execute(f"SELECT uid FROM {table} WHERE {parent_col}=?", (parent_id,)) }
-    incoming_uids = set()
-
-    # 2) upsert/insert
-    for i, item in enumerate(rows or []):
-        uid = _ensure_uid(item)
-        incoming_uids.add(uid)
-        # costruisci coppie (colonna, valore)
-        cols = [parent_col, "uid", order_field]
-        vals = [parent_id, uid, i]
-        for src, col in colmap.items():
-            cols.append(col)
-            vals.append(item.get(src))
-        if uid in existing:
-            # UPDATE
-            set_list = [f"{c}=?" for c in cols[2:]]  # non cambiamo parent_col, uid
-            con.execute(f"UPDATE {table} SET {', '.join(set_list)} WHERE {parent_col}=? AND uid=?",
-                        vals[2:] + [parent_id, uid])
-        else:
-            # INSERT
-            placeholders = ",".join("?" for _ in cols)
-            con.execute(f"INSERT INTO {table}({', '.join(cols)}) VALUES({placeholders})", vals)
-
-    # 3) delete righe sparite (se richiesto)
+    srcs = list(colmap.keys())
+    sql_delete, sql_upsert, sql_foreign = _merge_sql(table, parent_col, order_field, tuple(colmap.values()))
+    batch: List[Tuple[Any, ...]] = [
+        (parent_id, _ensure_uid(item), i, *[item.get(src) for src in srcs])
+        for i, item in enumerate(rows or [])
+    ]
+
+    # un uid ripetuto nel batch diventerebbe un ON CONFLICT sulla riga appena
+    # inserita: resterebbe solo l'ultima, quindi si rifiuta il merge
+    if len({r[1] for r in batch}) != len(batch):
+        seen = set()
+        for r in batch:
+            if r[1] in seen:
+                raise sqlite3.IntegrityError(f"{table}: uid {r[1]!r} ripetuto in {parent_col}={parent_id!r}")
+            seen.add(r[1])
+
+    uids = _dumps([r[1] for r in batch])
+    # uid è unico su tutta la tabella: se appartiene già a un'altra pratica
+    # l'UPSERT salterebbe la riga in silenzio, quindi si rifiuta il merge
+    if batch:
+        clash = con.execute(sql_foreign, (uids, parent_id)).fetchone()
+        if clash is not None:
+            raise sqlite3.IntegrityError(
+                f"{table}: uid {clash[0]!r} appartiene già a {parent_col}={clash[1]!r}")
+
+    # delete righe sparite (se richiesto): prima dell'upsert, così una riga
+    # ricreata con un nuovo uid non collide con la vecchia su altri vincoli
     if delete_missing:
-        to_delete = existing - incoming_uids
-        if to_delete:
-            con.executemany(f"DELETE FROM {table} WHERE {parent_col}=? AND uid=?",
-                            [(parent_id, u) for u in to_delete])
+        con.execute(sql_delete, (parent_id, uids))
+
+    if batch:
+        con.executemany(sql_upsert, batch)
+
+
+
+# SQL costanti a livello di modulo: stesso testo a ogni chiamata, quindi riusate
+# dalla cache di statement della connessione
+_SQL_UPSERT_PRATICA = """
+    INSERT INTO pratiche
+      (id_pratica, anno, numero, tipo_pratica, settore, materia, referente_email, referente_nome, preventivo, note, updated_at, raw_json, raw_hash)
+    VALUES (?,?,?,?,?,?,?,?,?,?,datetime('now'),?,?)
+    ON CONFLICT(id_pratica) DO UPDATE SET
+      anno=excluded.anno, numero=excluded.numero, tipo_pratica=excluded.tipo_pratica,
+      settore=excluded.settore, materia=excluded.materia,
+      referente_email=excluded.referente_email, referente_nome=excluded.referente_nome,
+      preventivo=excluded.preventivo, note=excluded.note,
+      updated_at=datetime('now'), raw_json=excluded.raw_json, raw_hash=excluded.raw_hash
+"""
 
 
+# tabelle figlie scritte da upsert_pratica: {campo_UI: colonna_DB} per tabella
+_CHILD_COLMAPS: Dict[str, Dict[str, str]] = {
+    "pratica_avvocati": {"email":"email","nome":"nome","ruolo":"ruolo"},
+    "pratica_tariffe": {"tipo_tariffa":"tipo_tariffa","valore":"valore","note":"note"},
+    "attivita": {"inizio":"inizio","fine":"fine","descrizione":"descrizione","durata_min":"durata_min","tariffa_eur":"tariffa_eur","tipo":"tipo","note":"note"},
+    "scadenze": {"data_scadenza":"data_scadenza","descrizione":"descrizione","note":"note","completata":"completata"},
+    "documenti": {"path":"path","categoria":"categoria","note":"note","hash":"hash"},
+}
+# SQL di merge compilato all'import: la prima pratica salvata non paga la costruzione
+for _t, _cm in _CHILD_COLMAPS.items():
+    _merge_sql(_t, "id_pratica", "pos", tuple(_cm.values()))
+del _t, _cm
+
+
+# chiavi del dict di pratica da cui upsert_pratica legge ogni tabella figlia
+# (vale la prima non vuota)
+_CHILD_SOURCES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("pratica_avvocati", ("avvocati", "pratica_avvocati")),
+    ("pratica_tariffe", ("tariffe", "pratica_tariffe")),
+    ("attivita", ("attivita", "attività")),
+    ("scadenze", ("scadenze",)),
+    ("documenti", ("documenti",)),
+)
+
+
+def _with_child_uids(pid: str, pratica: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]:
+    """Snapshot della pratica con un uid su ogni riga figlia, e le righe per tabella.
+
+    Gli uid mancanti si assegnano qui, prima di serializzare raw_json: così
+    snapshot, raw_hash e righe salvate riportano gli stessi uid. Sono
+    deterministici (avvocati: email+ruolo; altri: posizione), quindi lo stesso
+    dict senza uid (es. re-ingest dell'archivio) dà lo stesso hash e non
+    riscrive nulla. Le righe del chiamante non vengono modificate: quelle
+    senza uid sono copiate."""
+    snapshot = dict(pratica)
+    children: Dict[str, List[Dict[str, Any]]] = {}
+    for table, keys in _CHILD_SOURCES:
+        key = next((k for k in keys if pratica.get(k)), None)
+        rows = pratica[key] if key else []
+        if any(not (r.get("uid") or "").strip() for r in rows):
+            # avvocati senza alcun uid: fallback stabile su email+ruolo (l'uid
+            # è globale, quindi include la pratica; la n-esima ripetizione della
+            # stessa coppia riceve "|n"); altrimenti la posizione
+            by_email = table == "pratica_avvocati" and not any("uid" in r for r in rows)
+            seen: Dict[str, int] = {}
+            stamped = []
+            for i, r in enumerate(rows):
+                if (r.get("uid") or "").strip():
+                    stamped.append(r)
+                    continue
+                if by_email:
+                    uid = f"{pid}|{r.get('email','')}|{r.get('ruolo','')}"
+                    n = seen.get(uid, 0)
+                    seen[uid] = n + 1
+                    if n:
+                        uid = f"{uid}|{n}"
+                else:
+                    uid = f"{pid}|{table}|{i}"
+                stamped.append({**r, "uid": uid})
+            rows = stamped
+            snapshot[key] = rows
+        children[table] = rows
+    return snapshot, children
 
 
-def upsert_pratica(con, pratica: Dict[str, Any]) -> None:
+def upsert_pratica(con, pratica: Dict[str, Any]) -> bool:
+    """Salva la pratica (master + figli); False se era già salvata identica."""
     pid = pratica.get('id_pratica') or pratica.get('id') or pratica.get('codice')
     if not pid:
         raise ValueError('pratica senza id_pratica')
@@ -101,148 +248,181 @@ def upsert_pratica(con, pratica: Dict[str, Any]) -> None:
     ref_email = pratica.get('referente_email'); ref_nome = pratica.get('referente_nome')
     preventivo = 1 if pratica.get('preventivo') else 0
     note = pratica.get('note')
-    import json as _json
-    raw = _json.dumps(pratica, ensure_ascii=False)
+    snapshot, children = _with_child_uids(pid, pratica)
+    raw = _dumps(snapshot)
+    raw_hash = hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
 
     with atomic_tx(con):
-        # master
-        con.execute("""
-            INSERT INTO pratiche
-              (id_pratica, anno, numero, tipo_pratica, settore, materia, referente_email, referente_nome, preventivo, note, updated_at, raw_json)
-            VALUES (?,?,?,?,?,?,?,?,?,?,datetime('now'),?)
-            ON CONFLICT(id_pratica) DO UPDATE SET
-              anno=excluded.anno, numero=excluded.numero, tipo_pratica=excluded.tipo_pratica,
-              settore=excluded.settore, materia=excluded.materia,
-              referente_email=excluded.referente_email, referente_nome=excluded.referente_nome,
-              preventivo=excluded.preventivo, note=excluded.note,
-              updated_at=datetime('now'), raw_json=excluded.raw_json
-        """, (pid, anno, numero, tipo, settore, materia, ref_email, ref_nome, preventivo, note, raw))
-
-        # avvocati (consigliato: avere 'uid' lato UI; se manca usiamo email+ruolo implicitamente stabili)
-        avv = pratica.get('avvocati') or pratica.get('pratica_avvocati') or []
-        if avv and any('uid' in x for x in avv):
+        # snapshot identico a quello già salvato (es. re-ingest dell'archivio):
+        # master e figli sono stati scritti insieme da questo stesso dict, quindi
+        # non c'è nulla da fare; si confronta l'hash, senza rileggere il raw_json.
+        # Il controllo sta nella stessa transazione della scrittura. Vale finché
+        # le tabelle figlie si scrivono solo da qui: chi le modifica
+        # direttamente deve azzerare raw_hash. Le righe migrate hanno raw_hash
+        # NULL e vengono quindi riscritte al primo upsert.
+        prev = con.execute("SELECT raw_hash FROM pratiche WHERE id_pratica=?", (pid,)).fetchone()
+        if prev is not None and prev[0] == raw_hash:
+            return False
+
+        con.execute(_SQL_UPSERT_PRATICA, (pid, anno, numero, tipo, settore, materia, ref_email, ref_nome, preventivo, note, raw, raw_hash))
+
+        for table, rows in children.items():
             merge_children(con,
-                table="pratica_avvocati", parent_col="id_pratica", parent_id=pid,
-                rows=avv,
-                colmap={"email":"email","nome":"nome","ruolo":"ruolo"},
+                table=table, parent_col="id_pratica", parent_id=pid,
+                rows=rows,
+                colmap=_CHILD_COLMAPS[table],
                 order_field="pos"
             )
+    return True
+
+
+# collezioni figlie restituite da load_pratica: (chiave, tabella, (campo, colonna)..., ordinamento).
+# uid va sempre restituito: senza, un load → modifica → upsert_pratica rigenera
+# gli uid e cancella/reinserisce tutte le righe figlie
+_CHILD_LOAD_SPECS: Tuple[Tuple[str, str, Tuple[Tuple[str, str], ...], str], ...] = (
+    ('avvocati', 'pratica_avvocati', (('uid', 'uid'), ('ruolo', 'ruolo'), ('email', 'email'), ('nome', 'nome')), 'pos'),
+    ('tariffe', 'pratica_tariffe', (('uid', 'uid'), ('ordine', 'ordine'), ('tipo', 'tipo_tariffa')), 'ordine'),
+    ('attivita', 'attivita', (('id', 'id'), ('uid', 'uid'), ('inizio', 'inizio'), ('fine', 'fine'),
+                              ('descrizione', 'descrizione'), ('durata_min', 'durata_min'),
+                              ('tariffa_eur', 'tariffa_eur'), ('tipo', 'tipo'), ('note', 'note')), 'pos'),
+    ('scadenze', 'scadenze', (('id', 'id'), ('uid', 'uid'), ('data_scadenza', 'data_scadenza'),
+                              ('descrizione', 'descrizione'), ('note', 'note'), ('completata', 'completata')), 'pos'),
+    ('documenti', 'documenti', (('id', 'id'), ('uid', 'uid'), ('path', 'path'), ('categoria', 'categoria'),
+                                ('note', 'note'), ('hash', 'hash')), 'pos'),
+)
+
+
+def _build_load_sql(columnar: bool) -> str:
+    """Pratica + tutte le collezioni figlie in una sola query: ogni collezione
+    torna come array JSON (json_group_array) e viene decodificata in Python.
+    Ogni elemento è [ordinamento, riga], con la riga come oggetto JSON oppure
+    (columnar) come array posizionale. L'ordinamento si applica in Python:
+    SQLite non garantisce che json_group_array rispetti l'ORDER BY di una
+    sottoquery, e l'ORDER BY dentro l'aggregato richiede SQLite 3.44."""
+    subqueries = []
+    for _key, table, fields, order in _CHILD_LOAD_SPECS:
+        if columnar:
+            row = "json_array(" + ", ".join(c for _f, c in fields) + ")"
         else:
-            # fallback robusto su email+ruolo (mantiene stabilità senza uid)
-            con.execute("DELETE FROM pratica_avvocati WHERE id_pratica=?", (pid,))
-            for i, a in enumerate(avv):
-                con.execute("""INSERT INTO pratica_avvocati(id_pratica,uid,pos,email,nome,ruolo)
-                               VALUES(?,?,?,?,?,?)""",
-                            (pid, a.get('uid') or f"{a.get('email','')}|{a.get('ruolo','')}", i, a.get('email'), a.get('nome'), a.get('ruolo')))
-
-        # tariffe
-        merge_children(con,
-            table="pratica_tariffe", parent_col="id_pratica", parent_id=pid,
-            rows=pratica.get('tariffe') or pratica.get('pratica_tariffe') or [],
-            colmap={"tipo_tariffa":"tipo_tariffa","valore":"valore","note":"note"},
-            order_field="pos"
-        )
-
-        # attività
-        merge_children(con,
-            table="attivita", parent_col="id_pratica", parent_id=pid,
-            rows=pratica.get('attivita') or pratica.get('attività') or [],
-            colmap={"inizio":"inizio","fine":"fine","descrizione":"descrizione","durata_min":"durata_min","tariffa_eur":"tariffa_eur","tipo":"tipo","note":"note"},
-            order_field="pos"
-        )
-
-        # scadenze
-        merge_children(con,
-            table="scadenze", parent_col="id_pratica", parent_id=pid,
-            rows=pratica.get('scadenze') or [],
-            colmap={"data_scadenza":"data_scadenza","descrizione":"descrizione","note":"note","completata":"completata"},
-            order_field="pos"
-        )
-
-        # documenti
-        merge_children(con,
-            table="documenti", parent_col="id_pratica", parent_id=pid,
-            rows=pratica.get('documenti') or [],
-            colmap={"path":"path","categoria":"categoria","note":"note","hash":"hash"},
-            order_field="pos"
-        )
-
-
-def load_pratica(id_pratica: str, *, conn: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+            row = "json_object(" + ", ".join(f"'{f}', {c}" for f, c in fields) + ")"
+        subqueries.append(
+            f"      (SELECT json_group_array(json_array({order}, {row}))\n"
+            f"         FROM {table} WHERE id_pratica = p.id_pratica)")
+    return (
+        "    SELECT p.id_pratica, p.tipo_pratica, p.settore, p.materia, p.referente_nome,\n"
+        "           p.preventivo, p.note, p.created_at, p.updated_at,\n"
+        + ",\n".join(subqueries) + "\n"
+        "    FROM pratiche p\n"
+        "    WHERE p.id_pratica = ?\n"
+    )
+
+
+def _order_key(item: List[Any]) -> Tuple[bool, Any]:
+    # come ORDER BY in SQLite: i NULL per primi
+    pos = item[0]
+    return (pos is not None, pos if pos is not None else 0)
+
+
+_SQL_LOAD_PRATICA = _build_load_sql(columnar=False)
+_SQL_LOAD_PRATICA_COLUMNAR = _build_load_sql(columnar=True)
+
+
+def load_pratica(id_pratica: str, *, conn: Optional[Any] = None,
+                 columnar: bool = False, raw: bool = False) -> Optional[Dict[str, Any]]:
     """Load a practice from the database and reconstruct its nested structure.
 
+    The master row and all child collections are read with a single query.
+
     Args:
         id_pratica: Natural identifier of the practice (e.g. "8_2025").
         conn: Optional existing SQLite connection.
+        columnar: If true, each child collection is returned as
+            ``{field: [values...]}`` instead of a list of row dicts; much
+            lighter for tabular display of large practices.
+        raw: If true, return the snapshot stored in ``pratiche.raw_json`` by
+            ``upsert_pratica`` (the dict as it was saved, including the
+            child uids it assigned) with a
+            single-column read and no child-table access. Rows without a
+            snapshot fall back to the relational rebuild.
 
     Returns:
         A dictionary matching the JSON structure used by the application,
         or ``None`` if the practice does not exist.
     """
-    should_close = False
     if conn is None:
-        conn = get_connection()
-        should_close = True
-    cur = conn.cursor()
-    row = cur.execute("SELECT * FROM pratiche WHERE id_pratica = ?", (id_pratica,)).fetchone()
+        with get_connection() as con:
+            return load_pratica(id_pratica, conn=con, columnar=columnar, raw=raw)
+    if raw:
+        row = conn.execute("SELECT raw_json FROM pratiche WHERE id_pratica=?", (id_pratica,)).fetchone()
+        if row is None:
+            return None
+        if row[0]:
+            return _loads(row[0])
+    row = conn.execute(_SQL_LOAD_PRATICA_COLUMNAR if columnar else _SQL_LOAD_PRATICA,
+                       (id_pratica,)).fetchone()
     if row is None:
-        if should_close:
-            conn.close()
         return None
-    pratica = {
-        'id_pratica': row['id_pratica'],
+    pid, tipo, settore, materia, referente, preventivo, note, created_at, updated_at = row[:9]
+    children: Dict[str, Any] = {}
+    for (key, _table, fields, _order), blob in zip(_CHILD_LOAD_SPECS, row[9:]):
+        items = [row for _pos, row in sorted(_loads(blob), key=_order_key)]
+        if columnar:
+            names = [f for f, _c in fields]
+            values = [list(col) for col in zip(*items)] if items else [[] for _ in names]
+            children[key] = dict(zip(names, values))
+        else:
+            children[key] = items
+    if columnar:
+        children['scadenze']['completata'] = [bool(v) for v in children['scadenze']['completata']]
+    else:
+        for scad in children['scadenze']:
+            scad['completata'] = bool(scad['completata'])
+    return {
+        'id_pratica': pid,
         'metadata': {
-            'data_apertura': row['data_apertura'],
-            'data_chiusura': row['data_chiusura'],
-            'tipo': row['tipo'],
-            'settore': row['settore'],
-            'materia': row['materia'],
-            'referente': row['referente'],
-            'is_preventivo': bool(row['is_preventivo']),
-            'note': row['note'],
-            'created_at': row['created_at'],
-            'updated_at': row['updated_at'],
+            'data_apertura': None,   # non presenti nello schema
+            'data_chiusura': None,
+            'tipo': tipo,
+            'settore': settore,
+            'materia': materia,
+            'referente': referente,
+            'is_preventivo': bool(preventivo),
+            'note': note,
+            'created_at': created_at,
+            'updated_at': updated_at,
         },
-        'avvocati': [],
-        'tariffe': [],
-        'attivita': [],
-        'scadenze': [],
-        'documenti': [],
+        **children,
     }
-    for avv in cur.execute("SELECT ruolo, email, nome FROM pratica_avvocati WHERE id_pratica = ?", (id_pratica,)):
-        pratica['avvocati'].append({'ruolo': avv['ruolo'], 'email': avv['email'], 'nome': avv['nome']})
-    for tariffa in cur.execute("SELECT ordine, tipo_tariffa FROM pratica_tariffe WHERE id_pratica = ? ORDER BY ordine", (id_pratica,)):
-        pratica['tariffe'].append({'ordine': tariffa['ordine'], 'tipo': tariffa['tipo_tariffa']})
-    for att in cur.execute("SELECT * FROM attivita WHERE id_pratica = ?", (id_pratica,)):
-        pratica['attivita'].append({
-            'id': att['id'],
-            'inizio': att['inizio'],
-            'fine': att['fine'],
-            'descrizione': att['descrizione'],
-            'durata_min': att['durata_min'],
-            'tariffa_eur': att['tariffa_eur'],
-            'tipo': att['tipo'],
-            'note': att['note'],
-        })
-    for scad in cur.execute("SELECT * FROM scadenze WHERE id_pratica = ?", (id_pratica,)):
-        pratica['scadenze'].append({
-            'id': scad['id'],
-            'data_scadenza': scad['data_scadenza'],
-            'descrizione': scad['descrizione'],
-            'note': scad['note'],
-            'completata': bool(scad['completata']),
-        })
-    for doc in cur.execute("SELECT * FROM documenti WHERE id_pratica = ?", (id_pratica,)):
-        pratica['documenti'].append({
-            'id': doc['id'],
-            'path': doc['path'],
-            'categoria': doc['categoria'],
-            'note': doc['note'],
-            'hash': doc['hash'],
-        })
-    if should_close:
-        conn.close()
-    return pratica
+
+
+@lru_cache(maxsize=None)
+def _lookup_sql(table: str, key_col: str, val_col: str) -> Tuple[str, str]:
+    """SQL di _sync_lookup, costruito una volta per tabella (vedi _merge_sql)."""
+    _check_idents(table, key_col, val_col)
+    # "WHERE true" serve a SQLite per distinguere ON CONFLICT dalla SELECT
+    upsert = (f"INSERT INTO {table}({key_col},{val_col}) "
+              f"SELECT json_extract(value,'$[0]'), json_extract(value,'$[1]') FROM json_each(?) WHERE true "
+              f"ON CONFLICT({key_col}) DO UPDATE SET {val_col}=excluded.{val_col} "
+              f"WHERE {val_col} IS NOT excluded.{val_col}")
+    delete = (f"DELETE FROM {table} WHERE {key_col} NOT IN "
+              f"(SELECT json_extract(value,'$[0]') FROM json_each(?))")
+    return upsert, delete
+
+
+def _sync_lookup(con, table: str, key_col: str, val_col: str, rows: List[Tuple[Any, Any]]) -> None:
+    """Allinea una tabella di lookup a `rows` senza svuotarla: UPSERT sulla
+    chiave (le FK verso le righe esistenti restano valide) e DELETE delle sole
+    chiavi sparite. Le coppie viaggiano come un unico array JSON letto da
+    json_each: due statement per tabella, qualunque sia il numero di righe.
+    A parità di chiave vince la prima occorrenza (come il vecchio INSERT OR IGNORE)."""
+    sql_upsert, sql_delete = _lookup_sql(table, key_col, val_col)
+    first: Dict[Any, Any] = {}
+    for k, v in rows:
+        first.setdefault(k, v)
+    blob = _dumps([[k, v] for k, v in first.items()])
+    if rows:
+        con.execute(sql_upsert, (blob,))
+    con.execute(sql_delete, (blob,))
 
 
 def sync_lookups_from_json(lib_json_path: Optional[str] = None, *, con: Optional[Any] = None, db_path: Optional[str] = None) -> None:
@@ -267,8 +447,7 @@ def sync_lookups_from_json(lib_json_path: Optional[str] = None, *, con: Optional
     def load_json(name: str):
         p = lib / f'{name}.json'
         if p.exists():
-            with p.open('r', encoding='utf-8') as f:
-                return json.load(f)
+            return _loads(p.read_bytes())
         return None
 
     def normalize_code_label(data):
@@ -305,22 +484,9 @@ def sync_lookups_from_json(lib_json_path: Optional[str] = None, *, con: Optional
 
     try:
         with atomic_tx(con):
-            con.execute('DELETE FROM lookup_tipi_pratica')
-            con.execute('DELETE FROM lookup_settori')
-            con.execute('DELETE FROM lookup_materie')
-            con.execute('DELETE FROM lookup_avvocati')
-
-            tipi = normalize_code_label(load_json('tipo_pratica'))
-            if tipi:
-                con.executemany('INSERT OR IGNORE INTO lookup_tipi_pratica(codice,label) VALUES(?,?)', tipi)
-
-            sett = normalize_code_label(load_json('settori'))
-            if sett:
-                con.executemany('INSERT OR IGNORE INTO lookup_settori(codice,label) VALUES(?,?)', sett)
-
-            mate = normalize_code_label(load_json('materie'))
-            if mate:
-                con.executemany('INSERT OR IGNORE INTO lookup_materie(codice,label) VALUES(?,?)', mate)
+            _sync_lookup(con, 'lookup_tipi_pratica', 'codice', 'label', normalize_code_label(load_json('tipo_pratica')))
+            _sync_lookup(con, 'lookup_settori', 'codice', 'label', normalize_code_label(load_json('settori')))
+            _sync_lookup(con, 'lookup_materie', 'codice', 'label', normalize_code_label(load_json('materie')))
 
             avv = load_json('avvocati')
             rows = []
@@ -338,37 +504,132 @@ def sync_lookups_from_json(lib_json_path: Optional[str] = None, *, con: Optional
                     elif isinstance(v, dict):
                         nome = v.get('nome') or v.get('name') or v.get('label') or email
                         rows.append((str(email), str(nome)))
-            if rows:
-                con.executemany('INSERT OR REPLACE INTO lookup_avvocati(email,nome) VALUES(?,?)', rows)
+            _sync_lookup(con, 'lookup_avvocati', 'email', 'nome', rows)
     finally:
         if must_close:
             cm.__exit__(None, None, None)
 
 
 
-def ingest_archive_from_json(con, app_pratiche_dir: str) -> int:
-    import os, json, re
+def _iter_archive_json(root_dir: str, max_depth: Optional[int] = None):
+    """Percorsi dei file di pratica sotto root_dir (scandir: una sola stat per voce).
+    max_depth limita la discesa nelle sottocartelle (0 = solo root_dir)."""
+    stack = [(root_dir, 0)]
+    while stack:
+        d, depth = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                f = entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if max_depth is None or depth < max_depth:
+                            stack.append((entry.path, depth + 1))
+                        continue
+                except OSError:
+                    continue
+                if not f.endswith(_JSON_EXT):
+                    continue
+                if 'pratica' in f or _PRATICA_FNAME_RE.search(f):
+                    yield entry.path
+
+# sotto questa soglia il setup di mmap costa più della copia con read()
+_MMAP_MIN_BYTES = 16 * 1024
+
+def _read_json_file(p: str) -> Any:
+    try:
+        fd = os.open(p, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        size = os.fstat(fd).st_size
+        if orjson is not None and size >= _MMAP_MIN_BYTES:
+            # orjson legge direttamente dal buffer mappato: nessuna copia in bytes
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    return orjson.loads(view)
+        # file piccoli: read diretto sul descrittore già aperto, senza
+        # dup/fdopen; il ciclo copre letture parziali e file cresciuti nel frattempo
+        chunks = []
+        while True:
+            b = os.read(fd, max(size, 65536))
+            if not b:
+                break
+            chunks.append(b)
+        return _loads(b''.join(chunks))
+    except Exception:
+        return None
+    finally:
+        os.close(fd)
+
+# sotto questa soglia il pool (soprattutto di processi) costa più del parse
+_PARALLEL_MIN_FILES = 64
+
+def _parse_all(paths, workers: Optional[int] = None, threads: bool = True):
+    """Legge e decodifica i file in parallelo, restituendo i dict nell'ordine di `paths`.
+    Di default usa thread, come reindex._load_all: l'ingest può girare dentro
+    il server NiceGUI, dove un fork del processo dell'event loop non è sicuro.
+    threads=False (pool di processi) è per chi chiama da riga di comando."""
+    head = list(islice(paths, _PARALLEL_MIN_FILES))
+    if workers == 1 or len(head) < _PARALLEL_MIN_FILES:
+        yield from map(_read_json_file, head)
+        yield from map(_read_json_file, paths)
+        return
+    workers = workers or os.cpu_count() or 1
+    pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    window = workers * 64
+    with pool(max_workers=workers) as ex:
+        batch = head + list(islice(paths, window - len(head)))
+        while batch:
+            # a finestre limitate: la memoria non cresce con la dimensione dell'archivio
+            yield from ex.map(_read_json_file, batch, chunksize=32)
+            batch = list(islice(paths, window))
+
+# pratiche per transazione durante l'ingest dell'archivio
+_INGEST_BATCH = 500
+
+def ingest_archive_from_json(con, app_pratiche_dir: str,
+                             workers: Optional[int] = None, threads: bool = True,
+                             max_depth: Optional[int] = None,
+                             batch_size: Optional[int] = _INGEST_BATCH) -> int:
+    """Importa le pratiche JSON dell'archivio; restituisce quante ne ha scritte
+    (quelle già salvate identiche non contano)."""
     count = 0
     if not os.path.isdir(app_pratiche_dir):
         return 0
-    def _get(d,*names,default=None):
-        for n in names:
-            if n in d: return d[n]
-        return default
-    from repo_sqlite import upsert_pratica  # se è nello stesso file, puoi chiamare direttamente upsert_pratica
-    for root, dirs, files in os.walk(app_pratiche_dir):
-        candidates = [f for f in files if f.endswith('.json') and ('pratica' in f or re.search(r'\\d+_\\d+\\.json$', f))]
-        for f in candidates:
-            p = os.path.join(root, f)
-            try:
-                data = json.load(open(p, 'r', encoding='utf-8'))
-                pid = _get(data, 'id_pratica', 'id', 'codice')
-                if not pid:
+    # parse in un pool di thread (di processi con threads=False, solo da CLI);
+    # la scrittura resta su questo thread (la connessione SQLite è sua)
+    parsed = iter(_parse_all(_iter_archive_json(app_pratiche_dir, max_depth), workers, threads))
+    # una transazione ogni batch_size pratiche (None/0: tutto l'archivio in una):
+    # pochi commit, ma il WAL può essere checkpointato fra un lotto e l'altro e
+    # non cresce con l'archivio. Ogni pratica gira in un savepoint, quindi un
+    # file non valido non annulla gli altri. Se il chiamante ha già una
+    # transazione aperta i lotti diventano savepoint e il commit resta suo.
+    while True:
+        chunk = list(islice(parsed, batch_size)) if batch_size else list(parsed)
+        if not chunk:
+            break
+        with atomic_tx(con):
+            for data in chunk:
+                if not isinstance(data, dict):
                     continue
-                upsert_pratica(con, data)
-                count += 1
-            except Exception:
-                continue
+                try:
+                    if not (data.get('id_pratica') or data.get('id') or data.get('codice')):
+                        continue
+                    if upsert_pratica(con, data):
+                        count += 1
+                except Exception:
+                    continue
+    if count:
+        # statistiche aggiornate dopo il carico massivo: il planner usa gli
+        # indici (id_pratica, pos) invece di scansioni
+        con.execute("ANALYZE")
+    else:
+        # nessuna pratica scritta (archivio invariato): niente ANALYZE completo
+        con.execute("PRAGMA optimize")
     return count
 
 # --- sostituisci in repo_sqlite.py ---
@@ -378,8 +639,8 @@ def sync_lookups_from_json(con, lib_json_dir: str) -> None:
     def load_json(name):
         p = os.path.join(lib_json_dir, name)
         if os.path.exists(p):
-            with open(p, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(p, 'rb') as f:
+                return _loads(f.read())
         return None
 
     def normalize_code_label(data):
@@ -416,17 +677,6 @@ def sync_lookups_from_json(con, lib_json_dir: str) -> None:
     sett = normalize_code_label(load_json('settori.json') or [])
     mate = normalize_code_label(load_json('materie.json') or [])
 
-    con.execute('DELETE FROM lookup_tipi_pratica')
-    con.execute('DELETE FROM lookup_settori')
-    con.execute('DELETE FROM lookup_materie')
-
-    if tipi:
-        con.executemany("INSERT OR IGNORE INTO lookup_tipi_pratica(codice,label) VALUES(?,?)", tipi)
-    if sett:
-        con.executemany("INSERT OR IGNORE INTO lookup_settori(codice,label) VALUES(?,?)", sett)
-    if mate:
-        con.executemany("INSERT OR IGNORE INTO lookup_materie(codice,label) VALUES(?,?)", mate)
-
     # Avvocati: supporta sia lista di dict che dict mappa email->nome
     avv_data = load_json('avvocati.json') or []
     rows = []
@@ -449,7 +699,11 @@ def sync_lookups_from_json(con, lib_json_dir: str) -> None:
                 nome = v.get('nome') or v.get('name') or v.get('label') or email
                 rows.append((email, nome))
 
-    con.execute('DELETE FROM lookup_avvocati')
-    if rows:
-        con.executemany("INSERT OR REPLACE INTO lookup_avvocati(email,nome) VALUES(?,?)", rows)
+    # tutte le lookup in un'unica transazione: un solo commit, e chi legge non
+    # vede mai un set di lookup aggiornato a metà
+    with atomic_tx(con):
+        _sync_lookup(con, 'lookup_tipi_pratica', 'codice', 'label', tipi)
+        _sync_lookup(con, 'lookup_settori', 'codice', 'label', sett)
+        _sync_lookup(con, 'lookup_materie', 'codice', 'label', mate)
+        _sync_lookup(con, 'lookup_avvocati', 'email', 'nome', rows)
 
@@ -14,9 +14,10 @@ Esempio filename timestamp: {ID}_gp_DDMMYYYY_HHMMSS.json
 from __future__ import annotations
 from pathlib import Path
 from dataclasses import dataclass
-from typing import List, Optional, Tuple, Dict, Iterable
+from typing import List, Optional, Tuple, Dict
 from datetime import datetime, timedelta
-import re, os, itertools
+import re, os
+from concurrent.futures import ThreadPoolExecutor
 
 TIMESTAMP_RE = re.compile(r'^(?P<stem>.+)_gp_(?P<dt>\d{8}_\d{6})\.json$')  # es. 14082025_112233
 
@@ -28,38 +29,63 @@ class RetentionResult:
     deleted_files: List[str]
 
 def _parse_ts(name: str) -> Optional[datetime]:
-    m = TIMESTAMP_RE.match(name)
-    if not m:
+    # formato a larghezza fissa '<stem>_gp_DDMMYYYY_HHMMSS.json': slicing e int()
+    # invece di regex + strptime (che rilegge il formato a ogni chiamata)
+    if len(name) < 25 or not name.endswith('.json') or name[-24:-20] != '_gp_':
+        return None
+    ts = name[-20:-5]
+    d, t = ts[:8], ts[9:]
+    if ts[8] != '_' or not (d.isdecimal() and t.isdecimal()):
         return None
     try:
-        return datetime.strptime(m.group('dt'), '%d%m%Y_%H%M%S')
-    except Exception:
+        return datetime(int(d[4:]), int(d[2:4]), int(d[:2]), int(t[:2]), int(t[2:4]), int(t[4:]))
+    except ValueError:
         return None
 
-def _list_timestamp_backups(practice_dir: Path) -> List[Path]:
-    return [p for p in practice_dir.glob('*_gp_*.json') if TIMESTAMP_RE.match(p.name)]
+def _scan_timestamp_backups(practice_dir: Path) -> List[Tuple[Path, datetime, int]]:
+    """Copie timestamp (*_gp_*.json) nella cartella pratica come (path, data, dimensione):
+    una sola stat per file (DirEntry.stat), riusata per mtime e st_size."""
+    items = []
+    try:
+        it = os.scandir(practice_dir)
+    except OSError:
+        return items
+    with it:
+        for entry in it:
+            name = entry.name
+            # stessi file di Path.glob('*_gp_*.json') + TIMESTAMP_RE
+            if not TIMESTAMP_RE.match(name):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            dt = _parse_ts(name) or datetime.fromtimestamp(st.st_mtime)
+            items.append((Path(entry.path), dt, st.st_size))
+    return items
 
-def _bucket_key_day(dt: datetime) -> str:
-    return dt.strftime('%Y-%m-%d')
+# chiavi di bucket intere (niente strftime): servono solo a confrontare date
+def _bucket_key_day(dt: datetime) -> int:
+    return dt.toordinal()
 
-def _bucket_key_week(dt: datetime) -> str:
-    # ISO week => YYYY-Www
+def _bucket_key_week(dt: datetime) -> int:
+    # settimana ISO; le settimane per anno sono al massimo 53
     iso = dt.isocalendar()
-    return f"{iso.year}-W{iso.week:02d}"
+    return iso[0] * 54 + iso[1]
 
-def _bucket_key_month(dt: datetime) -> str:
-    return dt.strftime('%Y-%m')
+def _bucket_key_month(dt: datetime) -> int:
+    return dt.year * 12 + dt.month - 1
 
-def _select_newest_per_bucket(items: List[Tuple[Path, datetime, int]], bucket_fn, limit: int, already_kept: set) -> Iterable[Path]:
+def _select_newest_per_bucket(items: List[Tuple[Path, datetime, int]], bucket_fn, limit: int, already_kept: set) -> List[Path]:
     """Ritorna al più 'limit' file (Path) mantenendo il più recente per bucket non ancora coperto."""
     if limit is None or limit <= 0:
         return []
-    chosen = []
+    chosen: List[Path] = []
     seen = set()
     for p, dt, _sz in items:  # items è in ordine decrescente per dt
-        b = bucket_fn(dt)
-        if p in already_kept:  # già tenuto
+        if p in already_kept:  # già tenuto: non occupa il bucket
             continue
+        b = bucket_fn(dt)
         if b in seen:
             continue
         chosen.append(p)
@@ -68,6 +94,21 @@ def _select_newest_per_bucket(items: List[Tuple[Path, datetime, int]], bucket_fn
             break
     return chosen
 
+# sotto questa soglia il pool costa più delle unlink stesse
+_UNLINK_PARALLEL_MIN = 16
+_UNLINK_WORKERS = 8
+# pratiche elaborate in parallelo da enforce_retention_for_all: poche, perché
+# colpiscono tutte lo stesso filesystem
+_PRACTICE_WORKERS = 4
+
+def _unlink(p: Path) -> bool:
+    try:
+        os.unlink(p)
+        return True
+    except OSError:
+        # già sparito o non rimovibile: non conta come cancellato
+        return False
+
 def enforce_retention_for_practice(
     practice_dir: Path,
     keep_last: int = 7,
@@ -78,6 +119,7 @@ def enforce_retention_for_practice(
     strategy: str = "simple",
     keep_weeks: Optional[int] = None,
     keep_months: Optional[int] = None,
+    parallel_unlink: bool = True,
 ) -> RetentionResult:
     """Applica policy di retention alle copie timestamp nella cartella pratica.
 
@@ -92,13 +134,12 @@ def enforce_retention_for_practice(
         - Tieni 1 copia/settimana per 'keep_weeks' settimane
         - Tieni 1 copia/mese per 'keep_months' mesi
       (i livelli non si sommano duplicità: un file può coprire più bucket)
+
+    parallel_unlink=False cancella in sequenza: per chi è già parallelo sulle pratiche.
     """
     practice_dir = Path(practice_dir)
-    files = _list_timestamp_backups(practice_dir)
-    items = []
-    for p in files:
-        dt = _parse_ts(p.name) or datetime.fromtimestamp(p.stat().st_mtime)
-        items.append((p, dt, p.stat().st_size))
+    now = datetime.now()
+    items = _scan_timestamp_backups(practice_dir)
     # Ordina per data desc (più recente prima)
     items.sort(key=lambda t: t[1], reverse=True)
 
@@ -111,7 +152,7 @@ def enforce_retention_for_practice(
     if strategy == "simple":
         # Giorni recenti
         if keep_days is not None and keep_days >= 0:
-            threshold = datetime.now() - timedelta(days=keep_days)
+            threshold = now - timedelta(days=keep_days)
             for p, dt, _sz in items:
                 if dt >= threshold:
                     keep_set.add(p)
@@ -131,8 +172,6 @@ def enforce_retention_for_practice(
                         current -= sz
 
     else:  # strategy == "tiered"
-        now = datetime.now()
-
         # Giorni (1 per giorno)
         if keep_days is not None and keep_days > 0:
             chosen = _select_newest_per_bucket(items, _bucket_key_day, keep_days, keep_set)
@@ -161,22 +200,26 @@ def enforce_retention_for_practice(
                         keep_set.remove(p)
                         current -= sz
 
-    # Calcola cancellazioni
-    to_delete = [p for (p, _dt, _sz) in items if p not in keep_set]
+    # Calcola cancellazioni (dimensione già nota dalla scansione)
+    to_delete = [(p, sz) for (p, _dt, sz) in items if p not in keep_set]
 
     deleted = 0
     bytes_freed = 0
     deleted_files: List[str] = []
-    if not dry_run:
-        for p in to_delete:
-            try:
-                sz = p.stat().st_size
-                p.unlink(missing_ok=True)
+    if not dry_run and to_delete:
+        paths = [p for p, _sz in to_delete]
+        if parallel_unlink and len(paths) >= _UNLINK_PARALLEL_MIN:
+            # le unlink aspettano l'aggiornamento dei metadati della cartella:
+            # in parallelo il kernel le sovrappone
+            with ThreadPoolExecutor(max_workers=_UNLINK_WORKERS) as ex:
+                outcomes = list(ex.map(_unlink, paths))
+        else:
+            outcomes = [_unlink(p) for p in paths]
+        for (p, sz), ok in zip(to_delete, outcomes):
+            if ok:
                 deleted += 1
                 bytes_freed += sz
                 deleted_files.append(str(p))
-            except Exception:
-                continue
 
     return RetentionResult(kept=len(keep_set), deleted=deleted, bytes_freed=bytes_freed, deleted_files=deleted_files)
 
@@ -218,18 +261,33 @@ def enforce_retention_for_all(
     strategy: str = "simple",
     keep_weeks: Optional[int] = None,
     keep_months: Optional[int] = None,
+    workers: Optional[int] = None,
 ) -> Dict[str, RetentionResult]:
-    """Applica la retention a tutte le pratiche sotto practices_root."""
+    """Applica la retention a tutte le pratiche sotto practices_root.
+
+    Le pratiche sono indipendenti (solo filesystem) e vengono elaborate in un
+    pool di thread: il lavoro è fatto di stat/unlink, che rilasciano il GIL.
+    workers=None usa _PRACTICE_WORKERS thread, workers=1 l'esecuzione seriale.
+    In parallelo ogni pratica cancella in sequenza: niente pool annidati."""
     practices_root = Path(practices_root)
-    results: Dict[str, RetentionResult] = {}
-    for practice_dir in practices_root.iterdir():
-        if practice_dir.is_dir():
-            res = enforce_retention_for_practice(
-                practice_dir, keep_last, keep_days, max_megabytes, dry_run,
-                strategy=strategy, keep_weeks=keep_weeks, keep_months=keep_months
-            )
-            results[practice_dir.name] = res
-    return results
+    dirs = [d for d in practices_root.iterdir() if d.is_dir()]
+
+    workers = workers or _PRACTICE_WORKERS
+    serial = workers == 1 or len(dirs) < 2
+
+    def run(practice_dir: Path) -> RetentionResult:
+        return enforce_retention_for_practice(
+            practice_dir, keep_last, keep_days, max_megabytes, dry_run,
+            strategy=strategy, keep_weeks=keep_weeks, keep_months=keep_months,
+            parallel_unlink=serial
+        )
+
+    if serial:
+        outcomes = [run(d) for d in dirs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            outcomes = list(ex.map(run, dirs))
+    return {d.name: res for d, res in zip(dirs, outcomes)}
 
 if __name__ == "__main__":
     import argparse, json as _json
@@ -1,18 +1,31 @@
 
 from __future__ import annotations
 import sqlite3
-from typing import Optional, Any
+from typing import Optional, Any, Dict, List
 
 def pragma_columns(conn: sqlite3.Connection, table: str) -> list[str]:
     cur = conn.execute(f"PRAGMA table_info({table})")
     return [row[1] for row in cur.fetchall()]
 
+def schema_columns(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """Colonne (in ordine PRAGMA) di tutte le tabelle utente con una sola query.
+    Da usare come cache per la durata di un export invece di un PRAGMA per tabella."""
+    out: Dict[str, List[str]] = {}
+    cur = conn.execute(
+        "SELECT m.name, p.name FROM sqlite_master AS m, pragma_table_info(m.name) AS p "
+        "WHERE m.type='table' AND m.name NOT LIKE 'sqlite_%' ORDER BY m.name, p.cid"
+    )
+    for t, c in cur.fetchall():
+        out.setdefault(t, []).append(c)
+    return out
+
 def list_user_tables(conn: sqlite3.Connection) -> list[str]:
     cur = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY 1")
     return [r[0] for r in cur.fetchall()]
 
-def find_pratica_column(conn: sqlite3.Connection, table: str) -> Optional[str]:
-    cols = set(pragma_columns(conn, table))
+def find_pratica_column(conn: sqlite3.Connection, table: str,
+                        columns: Optional[List[str]] = None) -> Optional[str]:
+    cols = set(columns if columns is not None else pragma_columns(conn, table))
     if 'id_pratica' in cols:
         return 'id_pratica'
     if 'pratica_id' in cols:
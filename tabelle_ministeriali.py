@@ -63,8 +63,9 @@ def _wkhtmltopdf_path() -> Optional[str]:
             return c
     return None
 
-def _wkhtmltopdf_config():
-    """Prova ad auto-trovare wkhtmltopdf; se non disponibile, ritorna None."""
+def wkhtmltopdf_config():
+    """Prova ad auto-trovare wkhtmltopdf; se non disponibile, ritorna None.
+    Pubblica: chi esporta più PDF la risolve una volta e la passa a render_pdf_singolo."""
     if not _PDFKIT_AVAILABLE:
         return None
     path = _wkhtmltopdf_path()
@@ -176,22 +177,34 @@ def _render_html_tabella(dati: Dict, metadata: Dict, sezione: str) -> str:
 # Disponibilità export PDF
 PDF_EXPORT_AVAILABLE: bool = bool(_PDFKIT_AVAILABLE and _wkhtmltopdf_path())
 
+_PDF_OPTIONS = {
+    'encoding': 'UTF-8',
+    'margin-top': '15mm',
+    'margin-right': '15mm',
+    'margin-bottom': '15mm',
+    'margin-left': '15mm',
+}
+
+def _pdf_bytes(html_str: str, config=None) -> bytes:
+    """Converte l'HTML in PDF con wkhtmltopdf. Non usa la UI: sicura da un thread."""
+    if not PDF_EXPORT_AVAILABLE or not _PDFKIT_AVAILABLE or not pdfkit:  # type: ignore
+        raise RuntimeError('pdfkit/wkhtmltopdf assenti')
+    if config is None:
+        config = wkhtmltopdf_config()
+        if config is None:
+            raise RuntimeError('wkhtmltopdf non trovato')
+    return pdfkit.from_string(html_str, False, options=_PDF_OPTIONS, configuration=config)  # type: ignore
+
 def _pdf_from_html(html_str: str, filename: str) -> None:
     if not PDF_EXPORT_AVAILABLE or not _PDFKIT_AVAILABLE or not pdfkit:  # type: ignore
         ui.notify('Export PDF non disponibile (pdfkit/wkhtmltopdf assenti).', type='warning')
         return
     try:
-        config = _wkhtmltopdf_config()
+        config = wkhtmltopdf_config()
         if config is None:
             ui.notify('wkhtmltopdf non trovato. Installa il pacchetto di sistema o imposta il path.', type='negative')
             return
-        pdf_bytes = pdfkit.from_string(html_str, False, options={  # type: ignore
-            'encoding': 'UTF-8',
-            'margin-top': '15mm',
-            'margin-right': '15mm',
-            'margin-bottom': '15mm',
-            'margin-left': '15mm',
-        }, configuration=config)
+        pdf_bytes = _pdf_bytes(html_str, config)
         ui.download(pdf_bytes, filename)
         ui.notify('PDF generato con successo!', type='positive')
     except Exception as e:
@@ -342,9 +355,9 @@ async def handle_upload(e, pratica_data: Dict, refresh_callback: Callable, sezio
     except Exception as ex:
         ui.notify(f"Errore durante il caricamento: {str(ex)}", type='negative')
 
-def genera_pdf_singolo(dati: Dict, metadata: Dict, sezione: str) -> None:
+def _html_pdf_singolo(dati: Dict, metadata: Dict, sezione: str) -> str:
     # Documento con UNA tabella
-    html_str = f"""
+    return f"""
     <html>
         <head>
             <meta charset='UTF-8'>
@@ -359,8 +372,20 @@ def genera_pdf_singolo(dati: Dict, metadata: Dict, sezione: str) -> None:
         </body>
     </html>
     """
-    nome_file = f"tabella_ministeriale_{sezione}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
-    _pdf_from_html(html_str, nome_file)
+
+def _nome_pdf_singolo(sezione: str, indice: Optional[int] = None) -> str:
+    suffisso = f"_{indice}" if indice is not None else ""
+    return f"tabella_ministeriale_{sezione}_{datetime.now().strftime('%Y%m%d_%H%M')}{suffisso}.pdf"
+
+def render_pdf_singolo(dati: Dict, metadata: Dict, sezione: str, config=None,
+                       indice: Optional[int] = None) -> tuple[bytes, str]:
+    """Come genera_pdf_singolo ma senza UI: ritorna (pdf, nome_file).
+    Pensata per l'export in parallelo da thread; solleva eccezione in caso di errore.
+    `indice` distingue i nomi dei file quando se ne esportano più d'uno."""
+    return _pdf_bytes(_html_pdf_singolo(dati, metadata, sezione), config), _nome_pdf_singolo(sezione, indice)
+
+def genera_pdf_singolo(dati: Dict, metadata: Dict, sezione: str) -> None:
+    _pdf_from_html(_html_pdf_singolo(dati, metadata, sezione), _nome_pdf_singolo(sezione))
 
 def genera_pdf_tutte(pratica_data: Dict, sezione: str = 'contenzioso') -> None:
     """Un unico PDF con TUTTE le tabelle della sezione, paginate."""
@@ -0,0 +1,52 @@
+"""Test delle migrazioni dello schema SQLite (indici delle tabelle figlie)."""
+
+from __future__ import annotations
+
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from db_core import initialize_schema
+from db_migrations import run_migrations
+
+SCHEMA_FILE = Path(__file__).resolve().parents[1] / 'db_schema.sql'
+
+
+def _indexes(db_file: Path) -> set:
+    with sqlite3.connect(str(db_file)) as con:
+        return {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'")}
+
+
+class TestIndiciFigli(unittest.TestCase):
+
+    def test_schema_piu_migrazioni_stabile(self) -> None:
+        """Schema + migrazioni ripetuti (avvio del server) non ricreano gli indici ridondanti."""
+        with tempfile.TemporaryDirectory() as d:
+            db_file = Path(d) / 'test.sqlite'
+            for _ in range(2):
+                initialize_schema(str(db_file), schema_path=str(SCHEMA_FILE))
+                run_migrations(str(db_file))
+            idx = _indexes(db_file)
+            for t in ('attivita', 'scadenze', 'documenti', 'pratica_tariffe', 'pratica_avvocati'):
+                self.assertIn(f'idx_{t}_pos', idx)
+                self.assertNotIn(f'idx_{t}_pratica', idx)
+
+    def test_indici_legacy_di_fix_schema(self) -> None:
+        """Le migrazioni tolgono anche i nomi usati dalle vecchie versioni di tools/fix_schema.py."""
+        with tempfile.TemporaryDirectory() as d:
+            db_file = Path(d) / 'test.sqlite'
+            initialize_schema(str(db_file), schema_path=str(SCHEMA_FILE))
+            with sqlite3.connect(str(db_file)) as con:
+                # indici creati dalle versioni precedenti di fix_schema
+                con.execute("CREATE INDEX idx_pravv_pratica ON pratica_avvocati(id_pratica)")
+                con.execute("CREATE INDEX idx_ptar_pratica ON pratica_tariffe(id_pratica)")
+            run_migrations(str(db_file))
+            idx = _indexes(db_file)
+            self.assertTrue({'idx_pratica_avvocati_pos', 'idx_pratica_tariffe_pos'} <= idx)
+            self.assertFalse({'idx_pravv_pratica', 'idx_ptar_pratica'} & idx)
+            self.assertFalse({i for i in idx if i.endswith('_pratica') and i != 'idx_history_pratica'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Test del parsing e della formattazione degli importi in euro (preventivi_tariffe.py)."""
+
+from __future__ import annotations
+
+import unittest
+
+try:
+    import preventivi_tariffe as pt
+except ImportError:  # nicegui non installato
+    pt = None
+
+
+@unittest.skipIf(pt is None, 'preventivi_tariffe richiede nicegui')
+class TestParseEuro(unittest.TestCase):
+
+    def test_separatori_italiani_e_inglesi(self) -> None:
+        """Con entrambi i separatori il decimale è l'ultimo; la sola virgola è decimale."""
+        casi = {
+            '1.234,56': 1234.56,
+            '1,234.56': 1234.56,
+            '12,5': 12.5,
+            '12.5': 12.5,
+            '0,00': 0.0,
+            '-3,75': -3.75,
+        }
+        for testo, atteso in casi.items():
+            with self.subTest(testo=testo):
+                self.assertEqual(pt._parse_euro(testo), atteso)
+
+    def test_punti_delle_migliaia(self) -> None:
+        """Punti delle migliaia ripetuti, simbolo dell'euro e spazi (anche NBSP)."""
+        self.assertEqual(pt._parse_euro('1.234.567'), 1234567.0)
+        self.assertEqual(pt._parse_euro('1.234.567,89'), 1234567.89)
+        self.assertEqual(pt._parse_euro('€ 1.234,50'), 1234.5)
+        self.assertEqual(pt._parse_euro('1\xa0234,50 €'), 1234.5)
+        self.assertEqual(pt._parse_euro('2,000,000.25'), 2000000.25)
+
+    def test_valori_numerici_e_vuoti(self) -> None:
+        """int e float passano invariati; None, stringhe vuote o non valide valgono 0."""
+        self.assertEqual(pt._parse_euro(7), 7.0)
+        self.assertIsInstance(pt._parse_euro(7), float)
+        self.assertEqual(pt._parse_euro(1234.56), 1234.56)
+        for v in (None, '', '   ', 'abc', '€'):
+            with self.subTest(v=v):
+                self.assertEqual(pt._parse_euro(v), 0.0)
+
+    def test_cache_coerente(self) -> None:
+        """La seconda lettura della stessa stringa (dalla cache) dà lo stesso valore."""
+        self.assertEqual(pt._parse_euro('9.876,54'), pt._parse_euro('9.876,54'))
+
+
+@unittest.skipIf(pt is None, 'preventivi_tariffe richiede nicegui')
+class TestFormattazione(unittest.TestCase):
+
+    def test_formato_italiano(self) -> None:
+        self.assertEqual(pt.fmt(0), '0,00')
+        self.assertEqual(pt.fmt(1234567.8), '1.234.567,80')
+        self.assertEqual(pt.fmt(-12.5), '-12,50')
+
+    def test_mezzo_centesimo(self) -> None:
+        """Il mezzo centesimo si arrotonda per eccesso, indipendentemente dal binario del float."""
+        casi = {0.005: '0,01', 0.015: '0,02', 0.025: '0,03', 1.005: '1,01', 2.675: '2,68', 100.125: '100,13'}
+        for x, atteso in casi.items():
+            with self.subTest(x=x):
+                self.assertEqual(pt.fmt(x), atteso)
+        self.assertEqual(pt._cents(2.675), 268)
+        self.assertEqual(pt._cents(float('inf')), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Test dell'indice centrale (reindex.py)."""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from reindex import reindex
+
+
+def _write(folder: Path, data: dict) -> Path:
+    folder.mkdir(parents=True, exist_ok=True)
+    p = folder / 'pratica.json'
+    p.write_text(json.dumps(data), encoding='utf-8')
+    return p
+
+
+class TestReindex(unittest.TestCase):
+
+    def test_riscrittura_stessa_dimensione(self) -> None:
+        """Un file riscritto con la stessa dimensione ma mtime nuovo viene reindicizzato,
+        anche se gli mtime differiscono di un solo nanosecondo."""
+        with tempfile.TemporaryDirectory() as d:
+            root, db = Path(d) / 'archivio', Path(d) / 'indice.sqlite'
+            p = _write(root / 'p1', {'id_pratica': '1/2025', 'nome_pratica': 'AAAA'})
+            base_ns = 1_700_000_000_123_456_789
+            os.utime(p, ns=(base_ns, base_ns))
+            self.assertEqual(reindex(root, db), (1, 0))
+            # invariato: nessun insert/update
+            self.assertEqual(reindex(root, db), (0, 0))
+
+            size = p.stat().st_size
+            _write(root / 'p1', {'id_pratica': '1/2025', 'nome_pratica': 'BBBB'})
+            self.assertEqual(p.stat().st_size, size)
+            os.utime(p, ns=(base_ns + 1, base_ns + 1))
+            self.assertEqual(reindex(root, db), (0, 1))
+            with sqlite3.connect(str(db)) as con:
+                row = con.execute("SELECT nome, mtime_ns FROM pratiche WHERE id='1/2025'").fetchone()
+            self.assertEqual(row, ('BBBB', base_ns + 1))
+
+    def test_touch_aggiorna_solo_la_firma(self) -> None:
+        """Stessi byte con mtime nuovo: nessun update, ma la firma salvata segue il file."""
+        with tempfile.TemporaryDirectory() as d:
+            root, db = Path(d) / 'archivio', Path(d) / 'indice.sqlite'
+            p = _write(root / 'p1', {'id_pratica': '1/2025'})
+            self.assertEqual(reindex(root, db), (1, 0))
+            new_ns = p.stat().st_mtime_ns + 1_000
+            os.utime(p, ns=(new_ns, new_ns))
+            self.assertEqual(reindex(root, db), (0, 0))
+            with sqlite3.connect(str(db)) as con:
+                self.assertEqual(con.execute("SELECT mtime_ns FROM pratiche").fetchone()[0], new_ns)
+
+    def test_workers_seriale_e_thread(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d) / 'archivio'
+            for i in range(70):
+                _write(root / f'p{i}', {'id_pratica': f'{i}/2025'})
+            self.assertEqual(reindex(root, Path(d) / 'a.sqlite', workers=1), (70, 0))
+            self.assertEqual(reindex(root, Path(d) / 'b.sqlite'), (70, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
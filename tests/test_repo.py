@@ -0,0 +1,148 @@
+"""Test del salvataggio JSON delle pratiche (repo.py) e della history accodata."""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Optional
+from unittest import mock
+
+import history
+import repo
+from repo import _atomic_write_text, save_pratica_batch, write_pratica
+
+
+class TestScritturaAtomica(unittest.TestCase):
+
+    def test_atomic_write_senza_tmp(self) -> None:
+        """Testo e bytes vengono scritti per intero e il .tmp non resta su disco."""
+        with tempfile.TemporaryDirectory() as d:
+            p = Path(d) / 'sub' / 'pratica.json'
+            _atomic_write_text(p, '{"a": "è"}')
+            self.assertEqual(json.loads(p.read_text(encoding='utf-8')), {'a': 'è'})
+            _atomic_write_text(p, b'{"a": 2}')
+            self.assertEqual(p.read_bytes(), b'{"a": 2}')
+            self.assertEqual(sorted(x.name for x in p.parent.iterdir()), ['pratica.json'])
+
+
+class TestSalvataggioALotti(unittest.TestCase):
+
+    def setUp(self) -> None:
+        repo._WRITTEN.clear()
+
+    def test_lotto_scrive_solo_le_cambiate(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            a, b = Path(d) / 'a', Path(d) / 'b'
+            write_pratica(a, {'id_pratica': 'a', 'updated_at': 'x'})
+            history.flush_history()
+            out = save_pratica_batch([({'id_pratica': 'a', 'updated_at': 'x'}, a),
+                                      ({'id_pratica': 'b', 'updated_at': 'x'}, b)])
+            history.flush_history()
+            self.assertEqual(out, [a / 'pratica.json', b / 'pratica.json'])
+            self.assertEqual(json.loads((b / 'pratica.json').read_bytes())['id_pratica'], 'b')
+            self.assertEqual((len(_righe_history(a)), len(_righe_history(b))), (1, 1))
+
+    def test_errore_a_metà_chiude_e_rimuove_i_tmp(self) -> None:
+        """Un errore sulla seconda scrittura non lascia tmp né descrittori aperti
+        e non tocca i pratica.json esistenti."""
+        with tempfile.TemporaryDirectory() as d:
+            a, b = Path(d) / 'a', Path(d) / 'b'
+            write_pratica(a, {'id_pratica': 'a', 'updated_at': 'x'})
+            history.flush_history()
+            originale = (a / 'pratica.json').read_bytes()
+            chiamate = []
+
+            def write_all(fd: int, data: bytes) -> None:
+                chiamate.append(fd)
+                if len(chiamate) == 2:
+                    raise OSError('disco pieno')
+                os.write(fd, data)
+
+            fd_prima = _fd_aperti()
+            with mock.patch.object(repo, '_write_all', write_all):
+                with self.assertRaises(OSError):
+                    save_pratica_batch([({'id_pratica': 'a', 'updated_at': 'y'}, a),
+                                        ({'id_pratica': 'b', 'updated_at': 'y'}, b)])
+            self.assertEqual(_fd_aperti(), fd_prima)
+            self.assertEqual((a / 'pratica.json').read_bytes(), originale)
+            self.assertEqual(list(Path(d).rglob('*.tmp')), [])
+            self.assertFalse((b / 'pratica.json').exists())
+
+
+def _fd_aperti() -> Optional[int]:
+    """Descrittori aperti dal processo (None dove /proc non c'è)."""
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def _righe_history(folder: Path) -> list:
+    hist = folder / 'history.jsonl'
+    if not hist.exists():
+        return []
+    return [json.loads(r) for r in hist.read_text(encoding='utf-8').splitlines()]
+
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self) -> None:
+        repo._WRITTEN.clear()
+
+    def test_una_riga_per_salvataggio(self) -> None:
+        """Un salvataggio + flush_history() produce esattamente una riga di history."""
+        with tempfile.TemporaryDirectory() as d:
+            folder = Path(d) / 'pratica'
+            write_pratica(folder, {'id_pratica': '1', 'nome_pratica': 'A', 'updated_at': 'x'}, actor='test')
+            history.flush_history()
+            righe = _righe_history(folder)
+            self.assertEqual(len(righe), 1)
+            self.assertEqual((righe[0]['actor'], righe[0]['action']), ('test', 'save_pratica'))
+            self.assertIsNone(righe[0]['before_hash'])
+
+            write_pratica(folder, {'id_pratica': '1', 'nome_pratica': 'B', 'updated_at': 'y'})
+            history.flush_history()
+            righe = _righe_history(folder)
+            self.assertEqual(len(righe), 2)
+            self.assertIn('+  "nome_pratica": "B"', righe[1]['diff'])
+
+    def test_salvataggio_invariato_senza_history(self) -> None:
+        """Salvare di nuovo lo stesso contenuto non aggiunge righe, anche a cache vuota."""
+        with tempfile.TemporaryDirectory() as d:
+            folder = Path(d) / 'pratica'
+            dati = {'id_pratica': '1', 'nome_pratica': 'A', 'updated_at': 'x'}
+            write_pratica(folder, dati)
+            history.flush_history()
+            write_pratica(folder, dict(dati))
+            # senza la cache in RAM il confronto passa dal file su disco
+            repo._WRITTEN.clear()
+            write_pratica(folder, dict(dati))
+            history.flush_history()
+            self.assertEqual(len(_righe_history(folder)), 1)
+            self.assertEqual(dati, {'id_pratica': '1', 'nome_pratica': 'A', 'updated_at': 'x'})
+
+
+class TestCacheScritture(unittest.TestCase):
+
+    def setUp(self) -> None:
+        repo._WRITTEN.clear()
+
+    def test_cache_limitata_lru(self) -> None:
+        """La cache dei digest non supera _WRITTEN_MAX e scarta la cartella usata meno di recente."""
+        with tempfile.TemporaryDirectory() as d, mock.patch.object(repo, '_WRITTEN_MAX', 3):
+            folders = [Path(d) / f'p{i}' for i in range(5)]
+            for i, f in enumerate(folders[:3]):
+                write_pratica(f, {'id_pratica': str(i), 'updated_at': 'x'})
+            # p0 torna la più recente: il no-op la rinfresca nella LRU
+            write_pratica(folders[0], {'id_pratica': '0', 'updated_at': 'x'})
+            for i, f in enumerate(folders[3:], start=3):
+                write_pratica(f, {'id_pratica': str(i), 'updated_at': 'x'})
+            history.flush_history()
+            self.assertEqual(list(repo._WRITTEN), [str(folders[0]), str(folders[3]), str(folders[4])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,254 @@
+"""Test del livello SQLite (repo_sqlite.py): lookup da lib_json e upsert/load delle pratiche."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from db_core import initialize_schema, get_connection
+from db_migrations import run_migrations
+from repo_sqlite import (sync_lookups_from_json, upsert_pratica, load_pratica, ingest_archive_from_json,
+                         _with_child_uids)
+
+SCHEMA_FILE = Path(__file__).resolve().parents[1] / 'db_schema.sql'
+
+_LOOKUP_TABLES = (
+    ('lookup_tipi_pratica', 'codice', 'label'),
+    ('lookup_settori', 'codice', 'label'),
+    ('lookup_materie', 'codice', 'label'),
+    ('lookup_avvocati', 'email', 'nome'),
+)
+
+
+def _lookup_con() -> sqlite3.Connection:
+    con = sqlite3.connect(':memory:', isolation_level=None)
+    for t, k, v in _LOOKUP_TABLES:
+        con.execute(f'CREATE TABLE {t}({k} TEXT PRIMARY KEY, {v} TEXT)')
+    return con
+
+
+class TestSyncLookups(unittest.TestCase):
+
+    def test_chiavi_duplicate_vince_la_prima(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            lib = Path(d)
+            (lib / 'settori.json').write_text(json.dumps([
+                {'codice': 'CIV', 'label': 'Civile'},
+                {'codice': 'PEN', 'label': 'Penale'},
+                {'codice': 'CIV', 'label': 'Duplicato'},
+            ]), encoding='utf-8')
+            (lib / 'avvocati.json').write_text(json.dumps([
+                {'email': 'a@x.it', 'nome': 'Primo'},
+                {'email': 'a@x.it', 'nome': 'Secondo'},
+            ]), encoding='utf-8')
+            con = _lookup_con()
+            sync_lookups_from_json(con, str(lib))
+            self.assertEqual(con.execute('SELECT codice, label FROM lookup_settori ORDER BY codice').fetchall(),
+                             [('CIV', 'Civile'), ('PEN', 'Penale')])
+            self.assertEqual(con.execute('SELECT email, nome FROM lookup_avvocati').fetchall(), [('a@x.it', 'Primo')])
+
+    def test_risincronizzazione(self) -> None:
+        """Label cambiate vengono aggiornate, chiavi sparite rimosse."""
+        with tempfile.TemporaryDirectory() as d:
+            lib = Path(d)
+            con = _lookup_con()
+            (lib / 'materie.json').write_text(json.dumps({'A': 'Uno', 'B': 'Due'}), encoding='utf-8')
+            sync_lookups_from_json(con, str(lib))
+            (lib / 'materie.json').write_text(json.dumps({'A': 'Uno bis'}), encoding='utf-8')
+            sync_lookups_from_json(con, str(lib))
+            self.assertEqual(con.execute('SELECT codice, label FROM lookup_materie').fetchall(), [('A', 'Uno bis')])
+
+
+def _pratica() -> dict:
+    return {
+        'id_pratica': '7/2025',
+        'tipo_pratica': 'Civile',
+        'note': 'nota',
+        'avvocati': [{'uid': 'av1', 'email': 'a@x.it', 'nome': 'Avv', 'ruolo': 'referente'}],
+        'scadenze': [
+            {'uid': 's1', 'data_scadenza': '2025-09-01', 'descrizione': 'Prima', 'completata': False},
+            {'uid': 's2', 'data_scadenza': '2025-10-01', 'descrizione': 'Seconda', 'completata': True},
+        ],
+    }
+
+
+class TestUpsertPratica(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db_file = str(Path(self._tmp.name) / 'test.sqlite')
+        initialize_schema(self.db_file, schema_path=str(SCHEMA_FILE))
+        run_migrations(self.db_file)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def test_roundtrip_noop_e_modifica_figlio(self) -> None:
+        prat = _pratica()
+        with get_connection(self.db_file) as con:
+            upsert_pratica(con, prat)
+
+            # stessi dati: nessuna scrittura (né master né figli)
+            before = con.total_changes
+            upsert_pratica(con, _pratica())
+            self.assertEqual(con.total_changes, before)
+
+            # cambia solo una scadenza: si scrivono il master (raw_json cambia)
+            # e quella sola riga; l'altra scadenza e l'avvocato restano intatti
+            prat2 = _pratica()
+            prat2['scadenze'][1]['descrizione'] = 'Seconda modificata'
+            upsert_pratica(con, prat2)
+            self.assertEqual(con.total_changes - before, 2)
+
+            loaded = load_pratica('7/2025', conn=con)
+            self.assertEqual([s['descrizione'] for s in loaded['scadenze']], ['Prima', 'Seconda modificata'])
+            self.assertEqual([s['completata'] for s in loaded['scadenze']], [False, True])
+            self.assertEqual(loaded['avvocati'], [{'uid': 'av1', 'ruolo': 'referente', 'email': 'a@x.it', 'nome': 'Avv'}])
+            self.assertEqual([s['uid'] for s in loaded['scadenze']], ['s1', 's2'])
+            self.assertEqual(loaded['metadata']['tipo'], 'Civile')
+
+            col = load_pratica('7/2025', conn=con, columnar=True)
+            self.assertEqual(col['scadenze']['descrizione'], ['Prima', 'Seconda modificata'])
+            self.assertEqual(col['scadenze']['completata'], [False, True])
+            self.assertEqual(col['avvocati']['email'], ['a@x.it'])
+            self.assertEqual(col['documenti'], {'id': [], 'uid': [], 'path': [], 'categoria': [], 'note': [], 'hash': []})
+            self.assertEqual(col['scadenze']['uid'], ['s1', 's2'])
+
+            self.assertEqual(load_pratica('7/2025', conn=con, raw=True), prat2)
+            self.assertIsNone(load_pratica('manca', conn=con, raw=True))
+
+    def test_load_modifica_master_upsert_mantiene_figli(self) -> None:
+        """Una pratica ricaricata e risalvata non riscrive i figli: gli uid tornano dal load."""
+        prat = _pratica()
+        for s in prat['scadenze']:
+            del s['uid']
+        with get_connection(self.db_file) as con:
+            upsert_pratica(con, prat)
+            ids = con.execute("SELECT id, uid FROM scadenze ORDER BY pos").fetchall()
+
+            loaded = load_pratica('7/2025', conn=con)
+            loaded['note'] = 'nota modificata'
+            upsert_pratica(con, loaded)
+            self.assertEqual(con.execute("SELECT id, uid FROM scadenze ORDER BY pos").fetchall(), ids)
+            self.assertEqual(con.execute("SELECT note FROM pratiche").fetchone()[0], 'nota modificata')
+
+    def test_uid_assegnati_prima_dello_snapshot(self) -> None:
+        """raw_json riporta gli stessi uid delle righe figlie; il dict del chiamante resta intatto."""
+        prat = _pratica()
+        for s in prat['scadenze']:
+            del s['uid']
+        with get_connection(self.db_file) as con:
+            upsert_pratica(con, prat)
+            self.assertNotIn('uid', prat['scadenze'][0])
+            stored = [r[0] for r in con.execute("SELECT uid FROM scadenze ORDER BY pos")]
+            raw = load_pratica('7/2025', conn=con, raw=True)
+            self.assertEqual([s['uid'] for s in raw['scadenze']], stored)
+
+            # stesso dict senza uid (re-ingest): stesso hash, nessuna scrittura
+            before = con.total_changes
+            upsert_pratica(con, prat)
+            self.assertEqual(con.total_changes, before)
+
+    def test_raw_roundtrip_mantiene_figli(self) -> None:
+        """Lo snapshot raw, modificato e risalvato, non riscrive i figli."""
+        prat = _pratica()
+        for s in prat['scadenze']:
+            del s['uid']
+        with get_connection(self.db_file) as con:
+            upsert_pratica(con, prat)
+            ids = con.execute("SELECT id, uid FROM scadenze ORDER BY pos").fetchall()
+
+            raw = load_pratica('7/2025', conn=con, raw=True)
+            raw['note'] = 'nota modificata'
+            upsert_pratica(con, raw)
+            self.assertEqual(con.execute("SELECT id, uid FROM scadenze ORDER BY pos").fetchall(), ids)
+            self.assertEqual(load_pratica('7/2025', conn=con, raw=True), raw)
+
+    def test_avvocati_senza_uid_stessa_email_e_ruolo(self) -> None:
+        """Due avvocati senza uid con la stessa email+ruolo ricevono uid distinti e
+        stabili: non vengono fusi in una riga, e la chiave (id_pratica, email, ruolo)
+        di pratica_avvocati fa fallire l'upsert invece di perdere un avvocato."""
+        prat = _pratica()
+        prat['avvocati'] = [{'email': '', 'nome': 'Uno', 'ruolo': 'collaboratore'},
+                            {'email': '', 'nome': 'Due', 'ruolo': 'collaboratore'}]
+        snapshot, children = _with_child_uids('7/2025', prat)
+        uids = [a['uid'] for a in children['pratica_avvocati']]
+        self.assertEqual(uids, ['7/2025||collaboratore', '7/2025||collaboratore|1'])
+        self.assertEqual([a['uid'] for a in snapshot['avvocati']], uids)
+        self.assertEqual(_with_child_uids('7/2025', prat)[1]['pratica_avvocati'], children['pratica_avvocati'])
+
+        with get_connection(self.db_file) as con:
+            with self.assertRaises(sqlite3.IntegrityError):
+                upsert_pratica(con, prat)
+            self.assertEqual(con.execute("SELECT COUNT(*) FROM pratica_avvocati").fetchone()[0], 0)
+
+    def test_ordine_figli_da_pos(self) -> None:
+        """L'ordine delle collezioni segue pos, non l'ordine fisico delle righe."""
+        with get_connection(self.db_file) as con:
+            upsert_pratica(con, _pratica())
+            con.execute("UPDATE scadenze SET pos = 1 - pos")
+            loaded = load_pratica('7/2025', conn=con)
+            self.assertEqual([s['uid'] for s in loaded['scadenze']], ['s2', 's1'])
+            col = load_pratica('7/2025', conn=con, columnar=True)
+            self.assertEqual(col['scadenze']['uid'], ['s2', 's1'])
+
+    def test_uid_altra_pratica_rifiutato(self) -> None:
+        """Un uid figlio che appartiene già a un'altra pratica fa fallire l'upsert."""
+        with get_connection(self.db_file) as con:
+            upsert_pratica(con, _pratica())
+            altra = _pratica()
+            altra['id_pratica'] = '8/2025'
+            altra['avvocati'][0]['uid'] = 'av2'
+            with self.assertRaises(sqlite3.IntegrityError):
+                upsert_pratica(con, altra)
+            self.assertIsNone(con.execute("SELECT 1 FROM pratiche WHERE id_pratica='8/2025'").fetchone())
+
+    def test_uid_ripetuto_rifiutato(self) -> None:
+        """Due righe con lo stesso uid non vengono fuse in una: l'upsert fallisce."""
+        prat = _pratica()
+        prat['scadenze'] = [{'uid': 's', 'descrizione': 'one'}, {'uid': 's', 'descrizione': 'two'}]
+        with get_connection(self.db_file) as con:
+            with self.assertRaisesRegex(sqlite3.IntegrityError, "'s'"):
+                upsert_pratica(con, prat)
+            self.assertEqual(con.execute("SELECT COUNT(*) FROM scadenze").fetchone()[0], 0)
+            self.assertIsNone(con.execute("SELECT 1 FROM pratiche").fetchone())
+
+    def test_raw_hash_null_dopo_migrazione(self) -> None:
+        """Righe migrate (raw_hash NULL) vengono riscritte e l'hash valorizzato."""
+        with get_connection(self.db_file) as con:
+            upsert_pratica(con, _pratica())
+            con.execute("UPDATE pratiche SET raw_hash=NULL")
+            con.execute("DELETE FROM scadenze")
+            upsert_pratica(con, _pratica())
+            self.assertEqual(con.execute("SELECT COUNT(*) FROM scadenze").fetchone()[0], 2)
+            self.assertIsNotNone(con.execute("SELECT raw_hash FROM pratiche").fetchone()[0])
+
+    def test_raw_json_assente_usa_ricostruzione(self) -> None:
+        with get_connection(self.db_file) as con:
+            upsert_pratica(con, _pratica())
+            con.execute("UPDATE pratiche SET raw_json=NULL")
+            loaded = load_pratica('7/2025', conn=con, raw=True)
+            self.assertEqual(loaded['id_pratica'], '7/2025')
+            self.assertEqual(len(loaded['scadenze']), 2)
+
+    def test_reingest_invariato_senza_analyze(self) -> None:
+        """Un archivio invariato non scrive nulla e non rilancia ANALYZE."""
+        arch = Path(self._tmp.name) / 'archivio'
+        arch.mkdir()
+        (arch / '7_2025.json').write_text(json.dumps(_pratica()), encoding='utf-8')
+        with get_connection(self.db_file) as con:
+            self.assertEqual(ingest_archive_from_json(con, str(arch)), 1)
+            sql: list = []
+            con.set_trace_callback(sql.append)
+            try:
+                self.assertEqual(ingest_archive_from_json(con, str(arch)), 0)
+            finally:
+                con.set_trace_callback(None)
+            self.assertNotIn('ANALYZE', [q.strip().upper() for q in sql])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""Test della retention delle copie timestamp (retention.py)."""
+
+from __future__ import annotations
+
+import os
+import random
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from retention import TIMESTAMP_RE, _parse_ts, enforce_retention_for_all, enforce_retention_for_practice
+
+
+def _parse_ts_regex(name: str) -> Optional[datetime]:
+    """Implementazione originale (regex + strptime), riferimento per _parse_ts."""
+    m = TIMESTAMP_RE.match(name)
+    if not m:
+        return None
+    try:
+        return datetime.strptime(m.group('dt'), '%d%m%Y_%H%M%S')
+    except Exception:
+        return None
+
+
+class TestParseTs(unittest.TestCase):
+
+    def test_nomi_validi(self) -> None:
+        for name, atteso in (
+            ('P001_gp_14082025_112233.json', datetime(2025, 8, 14, 11, 22, 33)),
+            ('x_gp_01012000_000000.json', datetime(2000, 1, 1)),
+            ('a_gp_b_gp_29022024_235959.json', datetime(2024, 2, 29, 23, 59, 59)),
+        ):
+            with self.subTest(name=name):
+                self.assertEqual(_parse_ts(name), atteso)
+                self.assertEqual(_parse_ts_regex(name), atteso)
+
+    def test_equivalenza_con_regex_strptime(self) -> None:
+        """Date impossibili, nomi corti o malformati: stesso risultato della versione originale."""
+        casi = [
+            'P001_gp_31022025_112233.json',   # 31 febbraio
+            'P001_gp_29022023_112233.json',   # non bisestile
+            'P001_gp_14132025_112233.json',   # mese 13
+            'P001_gp_14082025_246000.json',   # ora 24
+            'P001_gp_14082025_115960.json',   # secondi 60
+            'P001_gp_00082025_112233.json',   # giorno 0
+            'P001_gp_14080000_112233.json',   # anno 0
+            '_gp_14082025_112233.json',       # stem vuoto
+            'gp_14082025_112233.json',
+            'P001_gp_1408202_112233.json',    # data corta
+            'P001_gp_14082025_11223.json',    # ora corta
+            'P001_gp_14082025-112233.json',
+            'P001_gp_14082025_112233.JSON',
+            'P001_gp_14082025_112233.json.bak',
+            'P001_gp_14o82025_112233.json',
+            'P001_gp_+1082025_112233.json',
+            'P001_gp_ 1082025_112233.json',
+            'P001_gp.json',
+            '.json',
+            '',
+        ]
+        for name in casi:
+            with self.subTest(name=name):
+                self.assertEqual(_parse_ts(name), _parse_ts_regex(name))
+
+    def test_equivalenza_casuale(self) -> None:
+        """Nomi generati a caso sull'alfabeto del formato (cifre, '_', 'gp', '.json')."""
+        rnd = random.Random(1234)
+        pezzi = ['0', '1', '2', '3', '9', '_', 'gp', '.json', 'x', '-']
+        base = 'P_gp_14082025_112233.json'
+        for _ in range(5000):
+            if rnd.random() < 0.5:
+                name = ''.join(rnd.choice(pezzi) for _ in range(rnd.randint(0, 14)))
+            else:
+                # mutazione di un carattere di un nome valido
+                i = rnd.randrange(len(base))
+                name = base[:i] + rnd.choice('0123456789_x.') + base[i + 1:]
+            self.assertEqual(_parse_ts(name), _parse_ts_regex(name), name)
+
+
+class TestRetention(unittest.TestCase):
+
+    def test_simple_tiene_le_ultime(self) -> None:
+        """strategy='simple': restano le ultime keep_last copie, le altre vengono cancellate."""
+        with tempfile.TemporaryDirectory() as d:
+            folder = Path(d)
+            nomi = [f'P1_gp_{g:02d}012025_120000.json' for g in range(1, 21)]
+            for n in nomi:
+                (folder / n).write_text('{}', encoding='utf-8')
+            (folder / 'pratica.json').write_text('{}', encoding='utf-8')
+            res = enforce_retention_for_practice(folder, keep_last=3)
+            self.assertEqual((res.kept, res.deleted, res.bytes_freed), (3, 17, 34))
+            rimasti = sorted(os.listdir(folder))
+            self.assertEqual(rimasti, sorted(nomi[-3:] + ['pratica.json']))
+
+    def test_dry_run_non_cancella(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            folder = Path(d)
+            for g in range(1, 6):
+                (folder / f'P1_gp_{g:02d}012025_120000.json').write_text('{}', encoding='utf-8')
+            res = enforce_retention_for_practice(folder, keep_last=1, dry_run=True)
+            self.assertEqual((res.kept, res.deleted), (1, 0))
+            self.assertEqual(len(os.listdir(folder)), 5)
+
+    def test_tutte_le_pratiche_in_parallelo(self) -> None:
+        """Con più pratiche (pool di thread, unlink in sequenza) il risultato è quello seriale."""
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d) / 'pratiche'
+            for i in range(3):
+                folder = root / f'P{i}'
+                folder.mkdir(parents=True)
+                for g in range(1, 21):
+                    (folder / f'P{i}_gp_{g:02d}012025_120000.json').write_text('{}', encoding='utf-8')
+            res = enforce_retention_for_all(root, Path(d) / 'backups', keep_last=3)
+            self.assertEqual({k: (r.kept, r.deleted) for k, r in res.items()},
+                             {f'P{i}': (3, 17) for i in range(3)})
+            self.assertEqual([len(os.listdir(root / f'P{i}')) for i in range(3)], [3, 3, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -39,6 +39,7 @@ def ensure_min_schema(con: sqlite3.Connection) -> list[str]:
         ("created_at","TEXT DEFAULT (datetime('now'))"),
         ("updated_at","TEXT"),
         ("raw_json","TEXT"),
+        ("raw_hash","TEXT"),
     ]:
         if _add_col(con, "pratiche", name, decl):
             changes.append(f"pratiche + {name}")
@@ -48,14 +49,14 @@ def ensure_min_schema(con: sqlite3.Connection) -> list[str]:
     for name, decl in [("uid","TEXT"), ("pos","INTEGER DEFAULT 0"), ("email","TEXT"), ("nome","TEXT"), ("ruolo","TEXT")]:
         if _add_col(con, "pratica_avvocati", name, decl):
             changes.append(f"pratica_avvocati + {name}")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_pravv_pratica ON pratica_avvocati(id_pratica)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_pratica_avvocati_pos ON pratica_avvocati(id_pratica, pos)")
 
     # --- pratica_tariffe ---
     _ensure_table(con, "CREATE TABLE IF NOT EXISTS pratica_tariffe(id_pratica TEXT NOT NULL);")
     for name, decl in [("uid","TEXT"), ("pos","INTEGER DEFAULT 0"), ("tipo_tariffa","TEXT"), ("valore","REAL"), ("note","TEXT")]:
         if _add_col(con, "pratica_tariffe", name, decl):
             changes.append(f"pratica_tariffe + {name}")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_ptar_pratica ON pratica_tariffe(id_pratica)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_pratica_tariffe_pos ON pratica_tariffe(id_pratica, pos)")
 
     # --- attivita ---
     _ensure_table(con, "CREATE TABLE IF NOT EXISTS attivita(id INTEGER PRIMARY KEY AUTOINCREMENT, id_pratica TEXT NOT NULL);")
@@ -63,7 +64,7 @@ def ensure_min_schema(con: sqlite3.Connection) -> list[str]:
                        ("durata_min","INTEGER"), ("tariffa_eur","REAL"), ("tipo","TEXT"), ("note","TEXT")]:
         if _add_col(con, "attivita", name, decl):
             changes.append(f"attivita + {name}")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_attivita_pratica ON attivita(id_pratica)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_attivita_pos ON attivita(id_pratica, pos)")
 
     # --- scadenze ---
     _ensure_table(con, "CREATE TABLE IF NOT EXISTS scadenze(id INTEGER PRIMARY KEY AUTOINCREMENT, id_pratica TEXT NOT NULL);")
@@ -71,7 +72,7 @@ def ensure_min_schema(con: sqlite3.Connection) -> list[str]:
                        ("note","TEXT"), ("completata","INTEGER DEFAULT 0")]:
         if _add_col(con, "scadenze", name, decl):
             changes.append(f"scadenze + {name}")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_scadenze_pratica ON scadenze(id_pratica)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_scadenze_pos ON scadenze(id_pratica, pos)")
 
     # --- documenti ---
     _ensure_table(con, "CREATE TABLE IF NOT EXISTS documenti(id INTEGER PRIMARY KEY AUTOINCREMENT, id_pratica TEXT NOT NULL);")
@@ -79,7 +80,7 @@ def ensure_min_schema(con: sqlite3.Connection) -> list[str]:
                        ("note","TEXT"), ("hash","TEXT")]:
         if _add_col(con, "documenti", name, decl):
             changes.append(f"documenti + {name}")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_documenti_pratica ON documenti(id_pratica)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_documenti_pos ON documenti(id_pratica, pos)")
 
     return changes
 
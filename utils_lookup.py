@@ -25,19 +25,30 @@ def _to_int(x: Any) -> Optional[int]:
         return None
 
 @lru_cache(maxsize=64)
-def _read_json(name: str) -> Dict[str, Any]:
-    """Legge lib_json/<name>.json e ritorna un dict ({} se non esiste o non valido)."""
-    p = LIB / f"{name}.json"
-    if not p.exists():
+def _read_json_at(name: str, mtime_ns: Optional[int]) -> Dict[str, Any]:
+    """Parse di lib_json/<name>.json memoizzato per (nome, mtime): un file modificato cambia chiave."""
+    if mtime_ns is None:
         return {}
     try:
-        return json.loads(_read_text(p)) or {}
+        return json.loads(_read_text(LIB / f"{name}.json")) or {}
     except Exception:
         return {}
 
+def _read_json(name: str) -> Dict[str, Any]:
+    """Legge lib_json/<name>.json e ritorna un dict ({} se non esiste o non valido).
+
+    Il costo per chiamata è uno stat(): il parse viene rifatto solo se l'mtime è cambiato,
+    così i refresher della UI vedono subito le modifiche ai JSON.
+    """
+    try:
+        mtime_ns: Optional[int] = (LIB / f"{name}.json").stat().st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    return _read_json_at(name, mtime_ns)
+
 def clear_caches() -> None:
     """Chiama questa dopo aver scritto/aggiornato JSON in lib_json."""
-    _read_json.cache_clear()  # type: ignore[attr-defined]
+    _read_json_at.cache_clear()  # type: ignore[attr-defined]
 
 def _get_list_field(obj: Dict[str, Any], key: str) -> List[Any]:
     """Ritorna obj[key] se è una lista, altrimenti []."""